@@ -0,0 +1,62 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Что импортирует каждая команда cli.py до первого запроса к API
+ENTRY_POINTS = {
+    "cli": "import cli",
+    "update-tokens": "from utils import update_tokens_info",
+    "refresh-state": "from utils import update_accounts_state",
+    "close-all": "from core import TradeManager",
+    "close-all + signing": "from core import TradeManager; from utils.trade import load_signing; load_signing()",
+    "run": "from core import TradeManager, CycleScheduler, PortfolioScheduler; from utils import start_checks; "
+           "from utils.trade import load_signing; load_signing()"
+}
+
+
+def measure(code: str) -> tuple:
+    # Каждый замер в свежем интерпретаторе: иначе модули уже лежат в sys.modules
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True
+    )
+
+    top_level = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Вложенные импорты выводятся с отступом, время верхнего уровня уже включает их
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative_us) / 1000
+    return sum(top_level.values()), top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта для команд cli.py")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'command':>20} {'median, ms':>11} {'min, ms':>9}  heaviest imports")
+    for name, code in ENTRY_POINTS.items():
+        runs = [measure(code) for _ in range(args.repeat)]
+        totals = [total for total, _ in runs]
+        _, modules = min(runs, key=lambda x: x[0])
+        heaviest = sorted(modules.items(), key=lambda x: -x[1])[:args.top]
+        print(
+            f"{name:>20} {statistics.median(totals):>11.1f} {min(totals):>9.1f}  "
+            f"{', '.join(f'{module} {ms:.0f}' for module, ms in heaviest)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
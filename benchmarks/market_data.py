@@ -0,0 +1,106 @@
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.mock_api import MockDeriveApi
+from benchmarks.mock_ws import MockTickerStream
+
+TOKENS = ["ETH", "BTC"]
+INTERVAL_MS = 20
+MAX_AGE_SEC = 0.3
+RECONNECT_DELAY_SEC = 0.1
+READS = 1000
+
+
+def wait_for(predicate, timeout_sec: float = 5, message: str = "") -> float:
+    started_at = time.perf_counter()
+    while not predicate():
+        assert time.perf_counter() - started_at < timeout_sec, message
+        time.sleep(0.005)
+    return time.perf_counter() - started_at
+
+
+def timed_reads(market_data, token: str, reads: int) -> list:
+    times = []
+    for _ in range(reads):
+        started_at = time.perf_counter()
+        market_data.get_ticker(token)
+        times.append((time.perf_counter() - started_at) * 1e6)
+    return times
+
+
+def run():
+    # MarketData через локальные моки: websocket для стрима, HTTP для REST-фолбэка. Никаких запросов к бирже
+    api = MockDeriveApi()
+    os.environ["DERIVE_API_URL"] = api.start()
+    stream = MockTickerStream(INTERVAL_MS)
+    ws_url = stream.start()
+
+    # utils читает DERIVE_API_URL при импорте, поэтому импортируем только после запуска мока
+    from utils import logger
+    from utils.market_data import MarketData, instrument_name_for
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    market_data = MarketData(TOKENS, {
+        "enabled": True,
+        "ws_url": ws_url,
+        "interval_ms": INTERVAL_MS,
+        "max_age_sec": MAX_AGE_SEC,
+        "reconnect_delay_sec": RECONNECT_DELAY_SEC
+    })
+    results = []
+    try:
+        # 1. Прогрев: оба инструмента приходят из стрима через _on_message
+        elapsed = wait_for(
+            lambda: all(market_data.cache.age(instrument_name_for(token)) < MAX_AGE_SEC for token in TOKENS),
+            message="стрим не прогрел кэш"
+        )
+        assert stream.subscriptions == 1, "ожидалась одна подписка"
+        results.append(("warmup", f"{elapsed * 1000:.1f} ms"))
+
+        # 2. Пока стрим живой, get_ticker не ходит в REST
+        requests_before = api.requests_count
+        stream_reads = timed_reads(market_data, "ETH", READS)
+        assert api.requests_count == requests_before, "при живом стриме был запрос в REST"
+        ticker = market_data.get_ticker("ETH")
+        assert ticker['instrument_name'] == "ETH-PERP" and "mark_price" in ticker, "неполный тикер из стрима"
+        results.append(("stream read p50", f"{statistics.median(stream_reads):.1f} us"))
+
+        # 3. Обрыв соединения: стрим переподключается, переподписывается и снова обновляет кэш
+        stream.drop_connections()
+        wait_for(lambda: stream.subscriptions == 2, message="стрим не переподключился")
+        marker = market_data.cache.get("ETH-PERP")['mark_price']
+        elapsed = wait_for(lambda: market_data.cache.get("ETH-PERP")['mark_price'] != marker, message="после переподключения нет обновлений")
+        results.append(("reconnect", f"{stream.connections} connections, first update in {elapsed * 1000:.1f} ms"))
+
+        # 4. Стрим завис: после max_age_sec тикер берется из REST и кладется в кэш
+        stream.paused.set()
+        time.sleep(MAX_AGE_SEC * 1.5)
+        requests_before = api.requests_count
+        rest_reads = timed_reads(market_data, "ETH", 1)
+        assert api.requests_count == requests_before + 1, "устаревший тикер не ушел в REST"
+        assert "tick_size" in market_data.get_ticker("ETH"), "в кэше нет полей REST тикера"
+        results.append(("REST fallback", f"{rest_reads[0] / 1000:.2f} ms"))
+
+        # 5. Сервер недоступен: стрим пытается переподключаться, get_ticker продолжает работать через REST
+        stream.paused.clear()
+        stream.stop()
+        time.sleep(MAX_AGE_SEC * 1.5)
+        requests_before = api.requests_count
+        market_data.get_ticker("BTC")
+        assert api.requests_count == requests_before + 1, "без стрима не было запроса в REST"
+        results.append(("server down", "REST ok"))
+    finally:
+        market_data.stop()
+        stream.stop()
+        api.stop()
+
+    for name, value in results:
+        print(f"{name:>16}  {value}")
+    print("MarketData: все проверки пройдены")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,200 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+INSTRUMENTS = {
+    "ETH-PERP": {"price": Decimal("2500"), "tick_size": "0.01", "amount_step": "0.01", "minimum_amount": "0.1"},
+    "BTC-PERP": {"price": Decimal("60000"), "tick_size": "0.1", "amount_step": "0.001", "minimum_amount": "0.01"}
+}
+FEE_RATE = Decimal("0.0003")
+
+
+class MockDeriveApi:
+    # Локальная замена api.lyra.finance: get_ticker, order, get_all_portfolios.
+    # Сервер заодно работает как HTTP-прокси, поэтому прокси аккаунтов можно направить на него же.
+    # /mock/register и /mock/orders — служебные методы для бенчмарка
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, partial_fill_rate: float = 0, subaccount_value: float = 100000,
+                 throttle_rate: float = 0):
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.partial_fill_rate = partial_fill_rate
+        self.subaccount_value = subaccount_value
+
+        self.wallets = {}
+        self.positions = {}
+        self.order_times = []
+        self.requests_count = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def register(self, wallet: str, subaccount_id: int):
+        with self._lock:
+            self.wallets.setdefault(wallet, set()).add(subaccount_id)
+
+    def mock_register(self, body: dict, headers) -> dict:
+        for subaccount_id in body['subaccount_ids']:
+            self.register(body['wallet'], subaccount_id)
+        return {"result": "ok"}
+
+    def mock_orders(self, body: dict, headers) -> dict:
+        # Время прихода ордеров с прошлого вызова, для окна без хеджа в бенчмарке
+        with self._lock:
+            order_times, self.order_times = self.order_times, []
+        return {"result": {"order_times": order_times, "requests": self.requests_count}}
+
+    def _sleep(self):
+        delay_ms = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+    def ticker(self, body: dict, headers) -> dict:
+        instrument_name = body['instrument_name']
+        spec = INSTRUMENTS[instrument_name]
+        price = spec['price']
+        return {"result": {
+            "instrument_name": instrument_name,
+            "base_asset_address": "0x" + "11" * 20,
+            "base_asset_sub_id": "0",
+            "tick_size": spec['tick_size'],
+            "amount_step": spec['amount_step'],
+            "minimum_amount": spec['minimum_amount'],
+            "best_ask_price": str(price),
+            "best_bid_price": str(price - Decimal(spec['tick_size'])),
+            "mark_price": str(price),
+            "max_price": str(price * Decimal("1.05")),
+            "min_price": str(price * Decimal("0.95"))
+        }}
+
+    def order(self, body: dict, headers) -> dict:
+        subaccount_id = body['subaccount_id']
+        instrument_name = body['instrument_name']
+        amount = Decimal(body['amount'])
+        sign = 1 if body['direction'] == "buy" else -1
+        self.register(headers.get("X-LyraWallet", ""), subaccount_id)
+
+        with self._lock:
+            self.order_times.append(time.time())
+            positions = self.positions.setdefault(subaccount_id, {})
+            position = positions.get(instrument_name, Decimal(0))
+
+            filled = amount
+            if random.random() < self.partial_fill_rate:
+                step = Decimal(INSTRUMENTS[instrument_name]['amount_step'])
+                filled = max(step, (amount / 2 // step) * step)
+            if body.get('reduce_only'):
+                filled = min(filled, abs(position)) if position * sign < 0 else Decimal(0)
+
+            positions[instrument_name] = position + sign * filled
+
+        price = INSTRUMENTS[instrument_name]['price']
+        return {"result": {
+            "order": {
+                "order_id": uuid.uuid4().hex,
+                "instrument_name": instrument_name,
+                "direction": body['direction'],
+                "amount": str(amount),
+                "filled_amount": str(filled),
+                "average_price": str(price),
+                "order_fee": str(filled * price * FEE_RATE),
+                "order_status": "filled"
+            },
+            "trades": []
+        }}
+
+    def portfolios(self, body: dict, headers) -> dict:
+        with self._lock:
+            subaccount_ids = sorted(self.wallets.get(body['wallet'], set()))
+            return {"result": [
+                {
+                    "subaccount_id": subaccount_id,
+                    "subaccount_value": str(self.subaccount_value),
+                    "positions": [
+                        {"instrument_name": instrument_name, "amount": str(amount), "mark_price": str(INSTRUMENTS[instrument_name]['price'])}
+                        for instrument_name, amount in self.positions.get(subaccount_id, {}).items()
+                        if amount != 0
+                    ]
+                }
+                for subaccount_id in subaccount_ids
+            ]}
+
+    def handle(self, path: str, body: dict, headers) -> tuple:
+        if path == "/mock/register":
+            return 200, self.mock_register(body, headers)
+        if path == "/mock/orders":
+            return 200, self.mock_orders(body, headers)
+
+        routes = {
+            "/public/get_ticker": self.ticker,
+            "/private/order": self.order,
+            "/private/get_all_portfolios": self.portfolios
+        }
+        with self._lock:
+            self.requests_count += 1
+
+        self._sleep()
+        if path not in routes:
+            return 404, {"error": {"code": 404, "message": f"Unknown method {path}"}}
+        if random.random() < self.throttle_rate:
+            return 429, {"error": {"code": -32000, "message": "Rate limit exceeded"}}
+        if random.random() < self.error_rate:
+            return 500, {"error": {"code": -32000, "message": "Injected error"}}
+        return 200, routes[path](body, headers)
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                # Запросы через "прокси" приходят с абсолютным URL
+                status, response = api.handle(urlsplit(self.path).path, body, self.headers)
+
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="mock-derive-api", daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальный мок Derive API")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--partial-fill-rate", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    api = MockDeriveApi(args.latency_ms, args.jitter_ms, args.error_rate, args.partial_fill_rate, throttle_rate=args.throttle_rate)
+    print(f"Мок Derive API: {api.start(port=args.port)} (DERIVE_API_URL)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        api.stop()
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from decimal import Decimal
+
+from aiohttp import web, WSMsgType
+
+from benchmarks.mock_api import INSTRUMENTS
+
+
+class MockTickerStream:
+    # Локальная замена wss://api.lyra.finance/ws: subscribe на ticker.{instrument}.{interval} и поток
+    # сообщений subscription в формате Derive. Цена сдвигается на тик с каждым сообщением, чтобы было видно свежесть.
+    # pause/resume останавливают рассылку без разрыва соединения, drop_connections рвет все соединения
+    def __init__(self, interval_ms: float = 50):
+        self.interval_ms = interval_ms
+        self.connections = 0
+        self.subscriptions = 0
+        self.messages = 0
+        self.paused = threading.Event()
+
+        self._seq = 0
+        self._sockets = set()
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    def _ticker(self, instrument_name: str) -> dict:
+        self._seq += 1
+        spec = INSTRUMENTS[instrument_name]
+        tick_size = Decimal(spec['tick_size'])
+        price = spec['price'] + tick_size * (self._seq % 100)
+        return {
+            "instrument_name": instrument_name,
+            "best_ask_price": str(price),
+            "best_bid_price": str(price - tick_size),
+            "mark_price": str(price),
+            "timestamp": int(time.time() * 1000)
+        }
+
+    async def _push(self, ws: web.WebSocketResponse, channels: list):
+        while not ws.closed:
+            if not self.paused.is_set():
+                for channel in channels:
+                    instrument_name = channel.split('.')[1]
+                    await ws.send_json({
+                        "method": "subscription",
+                        "params": {
+                            "channel": channel,
+                            "data": {"timestamp": int(time.time() * 1000), "instrument_ticker": self._ticker(instrument_name)}
+                        }
+                    })
+                    self.messages += 1
+            await asyncio.sleep(self.interval_ms / 1000)
+
+    async def _handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.add(ws)
+        self.connections += 1
+
+        pushers = []
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                body = json.loads(message.data)
+                if body.get('method') != "subscribe":
+                    continue
+                channels = body['params']['channels']
+                self.subscriptions += 1
+                await ws.send_json({"id": body.get('id'), "result": {"status": {channel: "ok" for channel in channels}}})
+                pushers.append(asyncio.ensure_future(self._push(ws, channels)))
+        finally:
+            for pusher in pushers:
+                pusher.cancel()
+            self._sockets.discard(ws)
+        return ws
+
+    async def _close_sockets(self):
+        for ws in list(self._sockets):
+            await ws.close()
+
+    def drop_connections(self):
+        asyncio.run_coroutine_threadsafe(self._close_sockets(), self._loop).result(timeout=5)
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mock-derive-ws", daemon=True)
+        self._thread.start()
+
+        async def setup():
+            app = web.Application()
+            app.router.add_get("/ws", self._handle)
+            self._runner = web.AppRunner(app)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, host, port)
+            await site.start()
+            return site._server.sockets[0].getsockname()[1]
+
+        port = asyncio.run_coroutine_threadsafe(setup(), self._loop).result(timeout=5)
+        return f"ws://{host}:{port}/ws"
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        async def cleanup():
+            await self._close_sockets()
+            await self._runner.cleanup()
+
+        asyncio.run_coroutine_threadsafe(cleanup(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальный мок websocket тикеров Derive")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--interval-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    stream = MockTickerStream(args.interval_ms)
+    print(f"Мок websocket тикеров: {stream.start(port=args.port)} (market_data.ws_url)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stream.stop()
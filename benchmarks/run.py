@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+from eth_account import Account
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "sequential": {
+        "hedge_execution": {"mode": "sequential", "max_workers": 32},
+        "emergency_close": {"mode": "sequential", "max_workers": 32, "max_rounds": 5, "poll_delay_sec": 0}
+    },
+    "concurrent": {
+        "hedge_execution": {"mode": "concurrent", "max_workers": 32},
+        "emergency_close": {"mode": "parallel", "max_workers": 32, "max_rounds": 5, "poll_delay_sec": 0}
+    }
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock(args) -> tuple:
+    # Мок в отдельном процессе, чтобы его CPU не попадал в CPU на ордер
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.mock_api",
+            "--port", str(port),
+            "--latency-ms", str(args.latency_ms),
+            "--jitter-ms", str(args.jitter_ms),
+            "--error-rate", str(args.error_rate),
+            "--partial-fill-rate", str(args.partial_fill_rate),
+            "--throttle-rate", str(args.throttle_rate)
+        ],
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL
+    )
+
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+
+    process.kill()
+    raise RuntimeError("Мок Derive API не запустился")
+
+
+def mock_call(mock_url: str, method: str, body: dict) -> dict:
+    return requests.post(f"{mock_url}/mock/{method}", json=body, timeout=10).json()['result']
+
+
+def make_workspace(num_accounts: int, mode: str, mock_url: str) -> str:
+    workspace = tempfile.mkdtemp(prefix=f"derive-bench-{num_accounts}-{mode}-")
+    os.makedirs(os.path.join(workspace, "data"))
+    port = mock_url.rsplit(":", 1)[1]
+
+    creds = []
+    for i in range(num_accounts):
+        wallet = Account.create().address
+        creds.append(f"{wallet}:{i + 1}:{Account.create().key.hex()}:127.0.0.1:{port}:bench:bench")
+        mock_call(mock_url, "register", {"wallet": wallet, "subaccount_ids": [i + 1]})
+
+    with open(os.path.join(REPO_ROOT, "config.json"), "r", encoding="utf-8") as file:
+        config = json.load(file)
+
+    # Одна сделка на все аккаунты: 1 лонг и num_accounts - 1 шортов, без задержек
+    config.update({
+        "pair_probability": {"ETH": 1},
+        "net_order_value_usd": {"min": num_accounts * 30, "max": num_accounts * 30},
+        "leverage": {"min": 1, "max": 1},
+        "num_of_accounts_per_trade": {"min": num_accounts, "max": num_accounts},
+        "delay_between_opening_hedge_position_sec": {"min": 0, "max": 0},
+        "state_refresh": {"max_workers": 32, "min_interval_per_proxy_sec": {"min": 0, "max": 0}},
+        "http_client": {**config.get("http_client", {}), "pool_maxsize": 64},
+        **MODES[mode]
+    })
+
+    files = {
+        "creds.txt": "\n".join(creds),
+        "config.json": json.dumps(config, indent=4),
+        "data/state.json": "[]",
+        "data/tokens.json": json.dumps([{"instrument_name": "ETH-PERP", "tick_size": 0.01, "amount_step": 0.01, "minimum_amount": 0.1}])
+    }
+    for name, content in files.items():
+        with open(os.path.join(workspace, name), "w", encoding="utf-8") as file:
+            file.write(content)
+
+    return workspace
+
+
+def measure(mock_url: str, name: str, func) -> tuple:
+    mock_call(mock_url, "orders", {})
+    started_at, cpu_started_at = time.perf_counter(), time.process_time()
+    result = func()
+    wall, cpu = time.perf_counter() - started_at, time.process_time() - cpu_started_at
+
+    order_times = mock_call(mock_url, "orders", {})['order_times']
+    orders = len(order_times)
+    return result, {
+        "scenario": name,
+        "wall_sec": wall,
+        "orders": orders,
+        "orders_per_sec": orders / wall if orders else 0,
+        "cpu_ms_per_order": cpu * 1000 / orders if orders else 0,
+        "unhedged_window_ms": (max(order_times) - min(order_times)) * 1000 if orders else 0
+    }
+
+
+def run_mode(num_accounts: int, mode: str, mock_url: str) -> list:
+    workspace = make_workspace(num_accounts, mode, mock_url)
+    os.chdir(workspace)
+    try:
+        results = run_scenarios(mock_url)
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    for stats in results:
+        stats.update({"accounts": num_accounts, "mode": mode})
+    return results
+
+
+def run_scenarios(mock_url: str) -> list:
+    from core import TradeManager
+    from utils import update_accounts_state
+
+    results = []
+
+    _, stats = measure(mock_url, "update_accounts_state", update_accounts_state)
+    results.append(stats)
+
+    manager = TradeManager(config_path="./config.json", state_path="./data/state.json", tokens_path="./data/tokens.json")
+    ticker = manager.market_data.get_ticker(manager.token)
+    amount = manager._calc_amount(ticker)
+
+    opened_positions, stats = measure(mock_url, "open_delta_neutral_position", lambda: manager.open_delta_neutral_position(amount, ticker))
+    results.append(stats)
+
+    _, stats = measure(mock_url, "close_all_positions", lambda: manager.close_all_positions(opened_positions, ticker))
+    results.append(stats)
+
+    # Открываем заново, чтобы экстренному закрытию было что закрывать
+    manager.open_delta_neutral_position(amount, ticker)
+    _, stats = measure(mock_url, "close_all_positions_with_api_info", manager.close_all_positions_with_api_info)
+    results.append(stats)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Оффлайн бенчмарк TradeManager на мок Derive API")
+    parser.add_argument("--accounts", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--jitter-ms", type=float, default=2)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--partial-fill-rate", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--json", help="Куда сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    process, mock_url = start_mock(args)
+    os.environ["DERIVE_API_URL"] = mock_url
+
+    # utils читает DERIVE_API_URL при импорте, поэтому импортируем только после запуска мока
+    from utils import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    results = []
+    try:
+        for num_accounts in args.accounts:
+            for mode in args.modes:
+                results.extend(run_mode(num_accounts, mode, mock_url))
+    finally:
+        process.terminate()
+
+    print(f"{'accounts':>8} {'mode':>10} {'scenario':>34} {'wall, s':>9} {'orders':>7} {'orders/s':>9} {'cpu ms/order':>13} {'unhedged, ms':>13}")
+    for x in results:
+        print(
+            f"{x['accounts']:>8} {x['mode']:>10} {x['scenario']:>34} {x['wall_sec']:>9.3f} {x['orders']:>7} "
+            f"{x['orders_per_sec']:>9.1f} {x['cpu_ms_per_order']:>13.2f} {x['unhedged_window_ms']:>13.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import random
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from utils.fleet import FleetModel
+from utils.split import to_step_units, from_step_units
+
+STEPS = [0.1, 0.01, 0.001, 0.0001]
+TOTAL_UNITS = [10, 1_000, 100_000]
+NUM_PARTS = [2, 3, 5, 10, 50, 200]
+ITERATIONS = 200
+PRICE = 2500.0
+MAX_LEVERAGE = 3
+
+
+def check_split(parts: np.ndarray, total_units: int, caps: np.ndarray):
+    assert len(parts) == len(caps), "неверное количество частей"
+    assert int(parts.sum()) == total_units, "сумма не сходится"
+    assert parts.min() >= 1, "часть меньше минимума"
+    assert (parts <= caps).all(), "часть больше своего cap"
+
+
+def noise_bounds(remaining: int, num_parts: int, noise: float) -> tuple:
+    # Вес части в [1 - noise, 1 + noise]: доля минимальна, когда остальные веса максимальны, и наоборот.
+    # Первый раунд дает части округленную вниз долю остатка. Недораздача после него меньше num_parts шагов
+    # и делится следующими раундами, так что в худшем случае целиком достается одной части
+    low = (1 - noise) / ((1 - noise) + (num_parts - 1) * (1 + noise))
+    high = (1 + noise) / ((1 + noise) + (num_parts - 1) * (1 - noise))
+    # Допуск на погрешность float в весах
+    return int(remaining * low - 1e-9) + 1, int(remaining * high + 1e-9) + 1 + min(num_parts - 1, remaining)
+
+
+def random_caps(rng: random.Random, total_units: int, num_parts: int) -> np.ndarray:
+    # Без ограничения, с запасом или впритык (сумма cap ровно total_units), чтобы излишек переливался между частями
+    kind = rng.choice(["free", "loose", "tight"])
+    if kind == "free":
+        return np.full(num_parts, total_units, dtype=np.int64)
+    caps = np.array([rng.randint(1, max(1, 2 * total_units // num_parts)) for _ in range(num_parts)], dtype=np.int64)
+    deficit = total_units - int(caps.sum())
+    if deficit > 0:
+        caps[rng.randrange(num_parts)] += deficit
+    if kind == "tight":
+        # Срезаем запас до нуля, не опускаясь ниже одного шага
+        extra = int(caps.sum()) - total_units
+        for i in rng.sample(range(num_parts), num_parts):
+            cut = min(extra, int(caps[i]) - 1)
+            caps[i] -= cut
+            extra -= cut
+    return caps
+
+
+def check_split_properties(cases: int, seed: int):
+    # Случайные сумма, число частей, шум и cap: сумма сохраняется, части не меньше шага и не больше cap,
+    # а если cap не ограничивает, то в границах шума
+    rng = random.Random(seed)
+    for case in range(cases):
+        num_parts = rng.randint(1, 300)
+        total_units = num_parts + rng.choice([0, rng.randint(0, 10), rng.randint(0, 10 ** rng.randint(1, 7))])
+        noise = rng.choice([0.0, rng.uniform(0, 0.99)])
+        caps = random_caps(rng, total_units, num_parts)
+
+        parts = FleetModel.split_units(total_units, caps, noise, np.random.default_rng(rng.getrandbits(64)))
+        context = f"случай {case} (seed {seed}): split_units({total_units}, caps={caps.tolist()[:10]}..., noise={noise})"
+
+        try:
+            check_split(parts, total_units, caps)
+        except AssertionError as e:
+            raise AssertionError(f"{context}: {e}")
+
+        low, high = noise_bounds(total_units - num_parts, num_parts, noise)
+        if caps.min() < high:
+            continue
+        for units in parts.tolist():
+            assert low <= units <= high, f"{context}: часть {units} шагов вне границ шума [{low}, {high}]"
+
+
+def check_plan_properties(cases: int, seed: int) -> int:
+    # Случайный флот с маской здоровья: в план попадают только здоровые разные аккаунты, лонг влезает целиком,
+    # шорты в свой max_units и в сумме дают лонг. Отказ допустим, только когда здоровых аккаунтов или их запаса не хватает
+    rng = random.Random(seed)
+    planned = 0
+    for case in range(cases):
+        size = rng.randint(2, 60)
+        num_accounts = rng.randint(2, min(size, 12))
+        amount_step = rng.choice([0.1, 0.01, 0.001])
+        total_units = rng.randint(num_accounts - 1, 5000)
+        total_amount = from_step_units(total_units, amount_step)
+        unit_usd = PRICE * amount_step / MAX_LEVERAGE
+        fleet = FleetModel(
+            [f"0x{i:040x}" for i in range(size)],
+            [unit_usd * rng.uniform(0, 2) * total_units for _ in range(size)],
+            [unit_usd * MAX_LEVERAGE * rng.choice([0, rng.uniform(0, 0.5) * total_units]) for _ in range(size)],
+            [rng.random() < 0.7 for _ in range(size)],
+            [rng.uniform(0, 300) for _ in range(size)]
+        )
+        units = fleet.max_units(PRICE, MAX_LEVERAGE, amount_step)
+        context = f"случай {case} (seed {seed}): plan_cycle({total_amount}, {num_accounts} аккаунтов, флот {size})"
+
+        try:
+            plan = fleet.plan_cycle(total_amount, num_accounts, PRICE, MAX_LEVERAGE, amount_step, rng.uniform(0, 0.5),
+                                    np.random.default_rng(rng.getrandbits(64)))
+        except ValueError as e:
+            # Лонг выбирается случайно из способных, поэтому план обязан собраться, только если подходит любой из них
+            short_ok = fleet.healthy & (units >= 1)
+            long_ok = np.flatnonzero(fleet.healthy & (units >= total_units))
+            feasible = len(long_ok) > 0 and short_ok.sum() >= num_accounts and all(
+                np.sort(units[short_ok & (np.arange(size) != i)])[::-1][:num_accounts - 1].sum() >= total_units
+                for i in long_ok
+            )
+            assert not feasible, f"{context}: отказ при достаточном здоровом флоте: {e}"
+            continue
+        planned += 1
+
+        index = {wallet: i for i, wallet in enumerate(fleet.wallets)}
+        selected = [index[plan['long']]] + [index[wallet] for wallet in plan['short']]
+        short_units = np.array([to_step_units(x, amount_step) for x in plan['short_amounts']], dtype=np.int64)
+        assert len(set(selected)) == num_accounts, f"{context}: аккаунты повторяются или их не {num_accounts}"
+        assert fleet.healthy[selected].all(), f"{context}: в план попал аккаунт с нездоровым прокси"
+        assert units[selected[0]] >= total_units, f"{context}: лонг не влезает в баланс при макс. плече"
+        try:
+            check_split(short_units, total_units, units[selected[1:]])
+        except AssertionError as e:
+            raise AssertionError(f"{context}: шорты: {e}")
+    return planned
+
+
+def check_properties(cases: int, seed: int):
+    check_split_properties(cases, seed)
+    planned = check_plan_properties(cases, seed)
+    print(f"Свойства split_units и plan_cycle выполнены на {cases} случайных входах, планов собрано {planned} (seed {seed})")
+
+
+def fleet_for(num_accounts: int, total_units: int, amount_step: float) -> FleetModel:
+    # Балансы с запасом на весь объем у каждого аккаунта: в замер не попадает перелив излишка
+    balance = total_units * amount_step * PRICE / MAX_LEVERAGE * 2
+    return FleetModel([f"0x{i:040x}" for i in range(num_accounts)], [balance] * num_accounts, [0.0] * num_accounts)
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Проверка свойств и бенчмарк FleetModel.split_units и plan_cycle")
+    parser.add_argument("--cases", type=int, default=2000, help="Сколько случайных входов проверить")
+    parser.add_argument("--seed", type=int, default=None, help="Seed для воспроизведения упавшего случая")
+    args = parser.parse_args()
+
+    check_properties(args.cases, args.seed if args.seed is not None else random.SystemRandom().getrandbits(32))
+
+    rng = np.random.default_rng(0)
+    print(f"{'step':>8} {'total':>12} {'parts':>6} {'us/split':>10} {'us/plan':>10}")
+
+    for amount_step in STEPS:
+        for total_units in TOTAL_UNITS:
+            for num_parts in NUM_PARTS:
+                if total_units < num_parts:
+                    continue
+                total_amount = from_step_units(total_units, amount_step)
+                caps = np.full(num_parts, total_units, dtype=np.int64)
+                # В цикле на num_parts шортов еще один аккаунт под лонг
+                fleet = fleet_for(num_parts + 1, total_units, amount_step)
+
+                split_elapsed = plan_elapsed = 0.0
+                for _ in range(ITERATIONS):
+                    started_at = time.perf_counter()
+                    parts = FleetModel.split_units(total_units, caps, rng=rng)
+                    split_elapsed += time.perf_counter() - started_at
+                    check_split(parts, total_units, caps)
+
+                    started_at = time.perf_counter()
+                    plan = fleet.plan_cycle(total_amount, num_parts + 1, PRICE, MAX_LEVERAGE, amount_step, rng=rng)
+                    plan_elapsed += time.perf_counter() - started_at
+                    assert sum(Decimal(str(x)) for x in plan['short_amounts']) == Decimal(str(total_amount)), "план не сходится по сумме"
+
+                print(
+                    f"{amount_step:>8} {total_amount:>12} {num_parts:>6} "
+                    f"{split_elapsed / ITERATIONS * 1e6:>10.1f} {plan_elapsed / ITERATIONS * 1e6:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,145 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import threading
+
+CONFIG_PATH = "./config.json"
+STATE_PATH = "./data/state.json"
+TOKENS_PATH = "./data/tokens.json"
+
+# Тяжелые модули (eth_account, web3, numpy, aiohttp) импортируются внутри команд,
+# чтобы каждая команда платила только за то, что использует
+
+
+def build_manager():
+    from core import TradeManager
+    return TradeManager(config_path=CONFIG_PATH, state_path=STATE_PATH, tokens_path=TOKENS_PATH)
+
+
+def run(args):
+    from core import CycleScheduler, PortfolioScheduler
+    from utils import start_checks
+
+    # start_checks уже сохраняет балансы в data/state.json
+    start_checks()
+
+    manager = build_manager()
+    manager.recover_open_cycles()
+    if manager.config.get("portfolio", {}).get("enabled", False):
+        PortfolioScheduler(manager).start()
+    elif manager.config.get("scheduler", {}).get("workers", 1) > 1:
+        CycleScheduler(manager).start()
+    else:
+        manager.start()
+
+
+def close_all(args):
+    from utils.trade import load_signing
+
+    manager = build_manager()
+    # Подпись ордеров нужна только после запроса позиций: web3 импортируется в фоне, пока идут запросы.
+    # Общий с web3 eth_account импортируется до этого в основном потоке: параллельный импорт пакетов
+    # с циклическими импортами внутри падает на частично инициализированных модулях
+    importlib.import_module("eth_account")
+    threading.Thread(target=load_signing, name="signing-preload", daemon=True).start()
+    manager.close_all_positions_with_api_info()
+
+
+def refresh_state(args):
+    from utils import update_accounts_state
+    update_accounts_state()
+
+
+def update_tokens(args):
+    from utils import update_tokens_info
+    update_tokens_info()
+
+
+def bench(args):
+    if args.suite == "orders":
+        from benchmarks.run import main as bench_main
+    elif args.suite == "imports":
+        from benchmarks.import_time import main as bench_main
+    elif args.suite == "market-data":
+        from benchmarks.market_data import run as bench_main
+    else:
+        from benchmarks.split_units import run as bench_main
+
+    # Аргументы после имени набора передаются бенчмарку как есть
+    sys.argv = [f"{sys.argv[0]} bench {args.suite}", *args.bench_args]
+    bench_main()
+
+
+def paper(args):
+    if args.action == "record":
+        from utils.paper import record_tickers
+        recorded = record_tickers(args.tokens, args.interval_sec, args.duration_min * 60, args.out)
+        print(f"Записано снапшотов: {recorded} в {args.out}")
+        return
+
+    if args.action == "simulate":
+        from core.simulation import simulate
+        summary = simulate()
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=4)
+        print(json.dumps(summary, ensure_ascii=False))
+        return
+
+    from core.simulation import expand_variants, run_sweep
+    with open(args.variants, "r", encoding="utf-8") as file:
+        variants = expand_variants(json.load(file))
+    results = run_sweep(variants, args.accounts, args.tickers, args.jobs, args.keep_workspaces)
+
+    print(f"{'variant':>7} {'cycles':>7} {'orders':>7} {'rejected':>8} {'volume, $':>12} {'fees, $':>9} {'pnl, $':>10} {'wall, s':>8}  error")
+    for x in results:
+        print(
+            f"{x['variant']:>7} {x.get('cycles', 0):>7} {x.get('orders', 0):>7} {x.get('rejected', 0):>8} {x.get('volume_usd', 0):>12.2f} "
+            f"{x.get('fees_usd', 0):>9.4f} {x.get('pnl_usd', 0):>10.4f} {x.get('wall_sec', 0):>8.2f}  {x.get('error') or ''}"
+        )
+    with open(args.out, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=4, ensure_ascii=False)
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Derive delta-neutral бот")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("run", help="Проверки и торговые циклы").set_defaults(func=run)
+    commands.add_parser("close-all", help="Экстренно закрыть все позиции по данным API").set_defaults(func=close_all)
+    commands.add_parser("refresh-state", help="Обновить балансы и позиции в data/state.json").set_defaults(func=refresh_state)
+    commands.add_parser("update-tokens", help="Обновить data/tokens.json по pair_probability").set_defaults(func=update_tokens)
+
+    bench_parser = commands.add_parser("bench", help="Оффлайн бенчмарки")
+    bench_parser.add_argument("suite", choices=["orders", "imports", "split", "market-data"])
+    bench_parser.add_argument("bench_args", nargs=argparse.REMAINDER)
+    bench_parser.set_defaults(func=bench)
+
+    paper_parser = commands.add_parser("paper", help="Бумажная торговля на записанных тикерах")
+    paper_actions = paper_parser.add_subparsers(dest="action", required=True)
+
+    record_parser = paper_actions.add_parser("record", help="Записать снапшоты get_ticker в JSONL")
+    record_parser.add_argument("--tokens", nargs="+", default=["ETH", "BTC"])
+    record_parser.add_argument("--interval-sec", type=float, default=1)
+    record_parser.add_argument("--duration-min", type=float, default=60)
+    record_parser.add_argument("--out", default="./data/tickers.jsonl")
+
+    simulate_parser = paper_actions.add_parser("simulate", help="Циклы по config.json текущей директории на бумажной бирже")
+    simulate_parser.add_argument("--out", default="./data/simulation.json")
+
+    sweep_parser = paper_actions.add_parser("sweep", help="Прогнать варианты конфига параллельно, каждый в своем процессе")
+    sweep_parser.add_argument("--variants", required=True, help="JSON: список оверрайдов config.json или сетка {ключ: [значения]}")
+    sweep_parser.add_argument("--tickers", default="./data/tickers.jsonl")
+    sweep_parser.add_argument("--accounts", type=int, default=10)
+    sweep_parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    sweep_parser.add_argument("--out", default="./data/sweep.json")
+    sweep_parser.add_argument("--keep-workspaces", action="store_true")
+    paper_parser.set_defaults(func=paper)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
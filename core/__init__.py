@@ -1 +1,22 @@
-from .trade_manager import TradeManager
\ No newline at end of file
+import importlib
+
+_EXPORTS = {
+    "TradeManager": "trade_manager",
+    "CycleScheduler": "scheduler",
+    "PortfolioScheduler": "scheduler",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return __all__
@@ -0,0 +1,210 @@
+import copy
+import random
+import threading
+import time
+
+from core.trade_manager import TradeManager, CycleAborted
+from utils import check_balance, logger
+
+DEFAULT_SETTINGS = {
+    "workers": 1,
+    "lease_poll_sec": 1
+}
+
+
+class AccountLeasePool:
+    # Аккаунт не может участвовать в двух циклах одновременно
+    def __init__(self, derive_wallets: list):
+        self._free = set(derive_wallets)
+        self._leased = set()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: int, prefer=None) -> list:
+        with self._lock:
+            if len(self._free) < n:
+                return None
+            free = sorted(self._free)
+            # Сначала аккаунты, прошедшие prefer (здоровые прокси), остальные только если первых не хватает
+            preferred = [wallet for wallet in free if prefer(wallet)] if prefer else free
+            if len(preferred) >= n:
+                leased = random.sample(preferred, n)
+            else:
+                preferred_set = set(preferred)
+                rest = [wallet for wallet in free if wallet not in preferred_set]
+                leased = preferred + random.sample(rest, n - len(preferred))
+            self._free.difference_update(leased)
+            self._leased.update(leased)
+            return leased
+
+    def release(self, derive_wallets: list):
+        with self._lock:
+            self._leased.difference_update(derive_wallets)
+            self._free.update(derive_wallets)
+
+    def sync(self, derive_wallets: list):
+        # Новые аккаунты из creds.txt попадают в пул, удаленные больше не выдаются
+        with self._lock:
+            derive_wallets = set(derive_wallets)
+            self._free = derive_wallets - self._leased
+            self._leased &= derive_wallets
+
+
+class ThroughputStats:
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.cycles = 0
+        self.notional_usd = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, cycle_result: dict):
+        with self._lock:
+            self.cycles += 1
+            self.notional_usd += cycle_result['notional_usd']
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            hours = max(time.monotonic() - self.started_at, 1e-9) / 3600
+            return {
+                "cycles": self.cycles,
+                "notional_usd": self.notional_usd,
+                "cycles_per_hour": self.cycles / hours,
+                "notional_usd_per_hour": self.notional_usd / hours
+            }
+
+
+class CycleScheduler:
+    # token и derive_wallets закрепляют планировщик за одним инструментом и своим пулом аккаунтов (режим портфеля)
+    def __init__(self, manager: TradeManager, workers: int = None, token: str = None, derive_wallets: list = None, stats: ThroughputStats = None):
+        settings = {**DEFAULT_SETTINGS, **manager.config.get("scheduler", {})}
+        self.manager = manager
+        self.workers = workers or settings['workers']
+        self.lease_poll_sec = settings['lease_poll_sec']
+        self.token = token
+        self.derive_wallets = None if derive_wallets is None else set(derive_wallets)
+
+        self.pool = AccountLeasePool(self._pool_wallets(manager.state))
+        self.stats = stats or ThroughputStats()
+        self._errors = []
+        self._errors_lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return f"{self.token} " if self.token else ""
+
+    def _pool_wallets(self, state: list) -> list:
+        wallets = [account['derive_wallet'] for account in state]
+        if self.derive_wallets is None:
+            return wallets
+        return [wallet for wallet in wallets if wallet in self.derive_wallets]
+
+    def _lease(self, worker: TradeManager) -> list:
+        while True:
+            leased = self.pool.acquire(worker.num_accounts, prefer=worker.is_account_healthy)
+            if leased is not None:
+                return leased
+            worker._sleep(self.lease_poll_sec)
+
+    def _run_worker(self, worker_id: int):
+        # Поверхностная копия: общие стор, тикеры и stop_event, но свои параметры цикла.
+        # mtime файлов у каждого свой: иначе индексы кошельков и токенов перестроит только первый заметивший
+        # изменение creds.txt/tokens.json воркер, а остальные получат из пула новые кошельки со старыми индексами
+        worker = copy.copy(self.manager)
+        worker._files_mtime = dict(self.manager._files_mtime)
+        worker.pinned_token = self.token
+
+        try:
+            while True:
+                worker._update_dynamic_state()
+                leased = self._lease(worker)
+                accounts = [worker.state_store.get(wallet) for wallet in leased]
+
+                try:
+                    logger.info(f"Воркер {self.name}{worker_id}: цикл на {worker.token} с аккаунтами {leased}")
+                    cycle_result = worker.run_cycle(accounts=accounts)
+                finally:
+                    self.pool.release(leased)
+
+                self.stats.record(cycle_result)
+                stats = self.stats.snapshot()
+                logger.info(
+                    f"Воркер {self.name}{worker_id}: цикл завершен. Пропускная способность: "
+                    f"{stats['cycles_per_hour']:.2f} циклов/ч, {stats['notional_usd_per_hour']:.0f}$/ч"
+                )
+
+                worker._sleep(worker.delay_between_positions)
+                worker._update_states(leased)
+                self.pool.sync(self._pool_wallets(worker.state))
+                check_balance(from_api=False)
+
+        except CycleAborted:
+            logger.info(f"Воркер {self.name}{worker_id} остановлен")
+        except Exception as e:
+            logger.exception(f"Воркер {self.name}{worker_id}: ошибка выполнения цикла: {e}")
+            with self._errors_lock:
+                self._errors.append(e)
+            self.manager.stop_event.set()
+
+    def spawn(self) -> list:
+        threads = []
+        for worker_id in range(self.workers):
+            name = f"cycle-worker-{self.token.lower()}-{worker_id}" if self.token else f"cycle-worker-{worker_id}"
+            thread = threading.Thread(target=self._run_worker, args=(worker_id,), name=name)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def start(self):
+        run_schedulers(self.manager, [self])
+
+
+def run_schedulers(manager: TradeManager, schedulers: list):
+    threads = [thread for scheduler in schedulers for thread in scheduler.spawn()]
+
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        manager.stop_event.set()
+        for thread in threads:
+            thread.join()
+        raise
+
+    # Все воркеры остановлены, теперь можно закрыть позиции по всему флоту один раз
+    manager.close_all_positions_with_api_info()
+    errors = [error for scheduler in schedulers for error in scheduler._errors]
+    error = errors[0] if errors else None
+    raise ValueError(f"Произошла ошибка выполнения основной функции: {error}")
+
+
+class PortfolioScheduler:
+    # Несколько инструментов одновременно: у каждого свои воркеры и свой непересекающийся пул аккаунтов.
+    # Подписанты, HTTP-клиент, стор состояния и кэш тикеров общие
+    def __init__(self, manager: TradeManager):
+        instruments = manager.config['portfolio']['instruments']
+        self.manager = manager
+        self.stats = ThroughputStats()
+
+        wallets = [account['derive_wallet'] for account in manager.state]
+        random.shuffle(wallets)
+        min_accounts = round(manager.config['num_of_accounts_per_trade']['max'])
+
+        # Доли накопительные: при сумме 1 округление не теряет аккаунтов, при сумме < 1 остаток не торгует
+        self.schedulers = []
+        start, cumulative_share = 0, 0
+        for token, settings in instruments.items():
+            cumulative_share += settings['accounts_share']
+            end = min(len(wallets), round(len(wallets) * cumulative_share))
+            pool = wallets[start:end]
+            start = end
+
+            if len(pool) < min_accounts:
+                raise ValueError(
+                    f"Инструменту {token} досталось {len(pool)} аккаунтов, а для цикла нужно до {min_accounts}. "
+                    f"Измените portfolio.instruments.{token}.accounts_share или num_of_accounts_per_trade"
+                )
+            manager._get_token_info(token)
+            self.schedulers.append(CycleScheduler(manager, settings.get('workers', 1), token, pool, self.stats))
+            logger.info(f"Портфель: {token} — {settings.get('workers', 1)} воркеров, {len(pool)} аккаунтов")
+
+    def start(self):
+        run_schedulers(self.manager, self.schedulers)
@@ -0,0 +1,173 @@
+import itertools
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.trade_manager import TradeManager
+from utils import extract_data, update_accounts_state, logger
+from utils.clock import VirtualClock, set_clock
+from utils.initial_checks import check_config
+from utils.misc import load_json, set_signer
+from utils.paper import DEFAULT_SETTINGS, TickerReplay, PaperExchange, PaperSigner, enable_paper_trading
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI_PATH = os.path.join(REPO_ROOT, "cli.py")
+SUMMARY_PATH = "./data/simulation.json"
+
+# Симуляция идет без сети и без fsync: прокси не проверяются, WAL выключен, тикеры только из записи
+SIMULATION_OVERRIDES = {
+    "state_refresh": {"max_workers": 32, "min_interval_per_proxy_sec": {"min": 0, "max": 0}},
+    "market_data": {"enabled": False},
+    "proxy_health": {"enabled": False},
+    "scheduler": {"workers": 1},
+    "portfolio": {"enabled": False},
+    "cycle_wal": {"enabled": False},
+    "logging": {"stdout_level": "WARNING", "file_level": "WARNING"}
+}
+
+
+def simulate(config_path: str = "./config.json", state_path: str = "./data/state.json", tokens_path: str = "./data/tokens.json") -> dict:
+    # Циклы TradeManager на бумажной бирже в текущей директории, пока не кончится запись тикеров или max_cycles.
+    # Конфиг проверяется как при боевом запуске: варианты свипа с неверными оверрайдами не должны идти молча
+    check_config(config_path, paper=True)
+    settings = {**DEFAULT_SETTINGS, **load_json(config_path).get("paper", {})}
+    if settings['seed'] is not None:
+        random.seed(settings['seed'])
+
+    replay = TickerReplay(settings['tickers_path'])
+    clock = VirtualClock(replay.start, settings['speed'])
+    set_clock(clock)
+
+    exchange = PaperExchange(replay, settings)
+    for account in extract_data():
+        exchange.register(account['derive_wallet'], account['subacc_id'])
+        if not settings['sign_orders']:
+            set_signer(account['session_pk'], PaperSigner(account['session_pk']))
+    enable_paper_trading(exchange)
+
+    update_accounts_state()
+    start_equity = exchange.equity()
+    manager = TradeManager(config_path=config_path, state_path=state_path, tokens_path=tokens_path)
+    if settings['seed'] is not None:
+        manager.plan_rng = np.random.default_rng(settings['seed'])
+
+    cycles = []
+    error = None
+    started_at = time.perf_counter()
+    try:
+        while len(cycles) < settings['max_cycles'] and clock.time() < replay.end:
+            cycles.append(manager.run_cycle())
+            manager._sleep(manager.delay_between_positions)
+            manager._update_states()
+    except Exception as e:
+        # Как в бою: после ошибки закрываем все по данным биржи, вариант считается неудачным
+        logger.warning(f"Симуляция остановлена ошибкой: {e}")
+        error = str(e)
+        manager.close_all_positions_with_api_info()
+
+    return {
+        "cycles": len(cycles),
+        "orders": exchange.stats['orders'],
+        "rejected": exchange.stats['rejected'],
+        "volume_usd": exchange.stats['volume_usd'],
+        "fees_usd": exchange.stats['fees_usd'],
+        "pnl_usd": exchange.equity() - start_equity,
+        "virtual_hours": (clock.time() - replay.start) / 3600,
+        "wall_sec": time.perf_counter() - started_at,
+        "error": error
+    }
+
+
+def expand_variants(spec) -> list:
+    # Список оверрайдов config.json как есть, либо сетка {ключ: [значения]} — все сочетания значений
+    if isinstance(spec, list):
+        return spec
+    keys = list(spec)
+    return [dict(zip(keys, values)) for values in itertools.product(*(spec[key] for key in keys))]
+
+
+def make_workspace(overrides: dict, num_accounts: int, tickers_path: str) -> str:
+    from eth_account import Account
+
+    workspace = tempfile.mkdtemp(prefix="derive-paper-")
+    os.makedirs(os.path.join(workspace, "data"))
+    replay = TickerReplay(tickers_path)
+
+    # Ключи случайные: ордера подписываются по-настоящему, но уходят только в бумажную биржу
+    creds = [
+        f"{Account.create().address}:{i + 1}:{Account.create().key.hex()}:127.0.0.1:9:paper:paper"
+        for i in range(num_accounts)
+    ]
+
+    config = load_json(os.path.join(REPO_ROOT, "config.json"))
+    config.update(SIMULATION_OVERRIDES)
+    # paper сливается, а не заменяется: вариант с paper.fee_rate не должен терять остальные настройки,
+    # а путь к записи тикеров всегда абсолютный, потому что вариант запускается в своей директории
+    config.update({key: value for key, value in overrides.items() if key != "paper"})
+    config['paper'] = {
+        **config.get("paper", {}),
+        **overrides.get("paper", {}),
+        "tickers_path": os.path.abspath(tickers_path)
+    }
+
+    # tokens.json из первого снапшота записи, в том же виде, что пишет update_tokens_info
+    tokens = []
+    for instrument_name in replay.instruments:
+        ticker = replay.get(instrument_name, replay.start)
+        tokens.append({
+            "instrument_name": instrument_name,
+            "tick_size": float(ticker['tick_size']),
+            "amount_step": float(ticker['amount_step']),
+            "minimum_amount": float(ticker['minimum_amount'])
+        })
+
+    files = {
+        "creds.txt": "\n".join(creds),
+        "config.json": json.dumps(config, indent=4, ensure_ascii=False),
+        "data/state.json": "[]",
+        "data/tokens.json": json.dumps(tokens, indent=4)
+    }
+    for name, content in files.items():
+        with open(os.path.join(workspace, name), "w", encoding="utf-8") as file:
+            file.write(content)
+    return workspace
+
+
+def run_variant(index: int, overrides: dict, num_accounts: int, tickers_path: str, keep_workspace: bool = False) -> dict:
+    # Каждый вариант в своем процессе: синглтоны (HTTP-клиент, стор, часы) и config.json у каждого свои
+    workspace = make_workspace(overrides, num_accounts, tickers_path)
+    try:
+        result = subprocess.run(
+            [sys.executable, CLI_PATH, "paper", "simulate", "--out", SUMMARY_PATH],
+            cwd=workspace,
+            capture_output=True,
+            text=True
+        )
+        summary_path = os.path.join(workspace, SUMMARY_PATH)
+        if result.returncode == 0 and os.path.exists(summary_path):
+            summary = load_json(summary_path)
+        else:
+            stderr = result.stderr.strip().splitlines()
+            summary = {"error": stderr[-1] if stderr else f"Код выхода {result.returncode}"}
+    finally:
+        if not keep_workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    return {"variant": index, "overrides": overrides, **summary, **({"workspace": workspace} if keep_workspace else {})}
+
+
+def run_sweep(variants: list, num_accounts: int, tickers_path: str, jobs: int = 1, keep_workspaces: bool = False) -> list:
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [
+            pool.submit(run_variant, index, overrides, num_accounts, tickers_path, keep_workspaces)
+            for index, overrides in enumerate(variants)
+        ]
+        return [future.result() for future in futures]
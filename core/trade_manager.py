@@ -1,18 +1,40 @@
+import os
 import random
+import threading
 import time
 import math
+from decimal import Decimal
+
+import numpy as np
 
 from utils import (
-    open_long,
-    open_short,
     update_accounts_state,
+    fetch_accounts_info,
     check_balance,
     extract_data,
-    get_instrument_ticker,
     get_account_info,
+    prepare_order,
+    submit_order,
+    submit_orders_concurrently,
     logger
 )
+from utils.logger import order_event
 from utils.misc import load_json
+from utils.state_store import get_state_store
+from utils.initial_data_extract import CREDS_PATH
+from utils.split import to_step_units, from_step_units
+from utils.fleet import FleetModel
+from utils.orders import CycleRecord, OrderFill, UNKNOWN_STATUS, parse_order_response
+from utils.market_data import MarketData
+from utils.metrics import metrics, configure_metrics
+from utils.proxy_health import proxy_health, configure_proxy_health
+from utils.cycle_wal import get_cycle_wal
+from utils.journal import get_journal
+from utils.clock import get_clock
+
+class CycleAborted(Exception):
+    pass
+
 
 class TradeManager:
     RANDOM_PARAMS = {
@@ -23,20 +45,67 @@ class TradeManager:
         "net_order_value": "net_order_value_usd",
         "delay_between_opening_hedge_position_sec": "delay_between_opening_hedge_position_sec"
     }
+    CLOSE_PRESIGN_LEAD_SEC = 5
+    MAX_TOPUP_ATTEMPTS = 3
 
     def __init__(self, config_path: str, state_path: str, tokens_path: str):
         self.config_path = config_path
         self.state_path = state_path
         self.tokens_path = tokens_path
-        self.wallets_data = extract_data()
-
-        self.state = load_json(state_path)
+        self._files_mtime = {}
+        self.stop_event = threading.Event()
+        self.cycle_record = None
+        # В режиме портфеля воркер закреплен за одним инструментом
+        self.pinned_token = None
+        # Генератор для выбора аккаунтов и сплита, симуляция задает его с seed для воспроизводимости
+        self.plan_rng = None
+        self._load_wallets_data()
+        self._load_tokens()
+
+        self.state_store = get_state_store(state_path)
+        self.cycle_wal = get_cycle_wal()
+        self.journal = get_journal()
+        self.state = self.state_store.all()
         self.config = load_json(config_path)
-        self.tokens = load_json(tokens_path)
+        configure_metrics(self.config.get("metrics"))
+        configure_proxy_health(self.config.get("proxy_health"), [account['proxy'] for account in self.wallets_data])
+        self.market_data = MarketData(list(self.config['pair_probability'].keys()), self.config.get("market_data"))
 
         self._update_dynamic_state()
         logger.info("TradeManager успешно инициализирован")
 
+    def _file_changed(self, path: str) -> bool:
+        mtime = os.path.getmtime(path)
+        if self._files_mtime.get(path) == mtime:
+            return False
+        self._files_mtime[path] = mtime
+        return True
+
+    def _load_wallets_data(self):
+        self._file_changed(CREDS_PATH)
+        self.wallets_data = extract_data()
+        self._wallets_index = {}
+        for account in self.wallets_data:
+            self._wallets_index.setdefault(account['derive_wallet'], account)
+
+    def _load_tokens(self):
+        self._file_changed(self.tokens_path)
+        self.tokens = load_json(self.tokens_path)
+        self._tokens_index = {}
+        for token_info in self.tokens:
+            instrument_name = token_info['instrument_name']
+            self._tokens_index[instrument_name] = token_info
+            self._tokens_index.setdefault(instrument_name.split('-')[0], token_info)
+
+    def _reload_changed_files(self):
+        if self._file_changed(CREDS_PATH):
+            logger.info("creds.txt изменился, перестраиваю индекс кошельков")
+            self._load_wallets_data()
+            proxy_health.watch([account['proxy'] for account in self.wallets_data])
+        if self._file_changed(self.tokens_path):
+            logger.info("tokens.json изменился, перестраиваю индекс токенов")
+            self._load_tokens()
+
     def _generate_random_param(self, param_name: str, multiplier: float = 1) -> float:
         param = self.config[self.RANDOM_PARAMS[param_name]]
         return random.uniform(param['min'], param['max']) * multiplier
@@ -52,139 +121,39 @@ class TradeManager:
         )
         self.net_order_value_usd = self._generate_random_param("net_order_value")
 
-    def _update_states(self):
-        update_accounts_state()
-        self.state = load_json(self.state_path)
+    def _sleep(self, seconds: float):
+        # Прерываемый sleep: планировщик останавливает все циклы перед экстренным закрытием.
+        # В бумажной торговле часы виртуальные и паузы сжимаются
+        if get_clock().sleep(seconds, self.stop_event):
+            raise CycleAborted("Цикл прерван, идет экстренное закрытие позиций")
+
+    def _update_states(self, derive_wallets: list = None):
+        update_accounts_state(derive_wallets)
+        self.state = self.state_store.all()
+        self._reload_changed_files()
         self._update_dynamic_state()
 
     def _select_token(self) -> str:
+        if self.pinned_token:
+            return self.pinned_token
         tokens = list(self.config['pair_probability'].keys())
         probabilities = list(self.config['pair_probability'].values())
         return random.choices(tokens, probabilities, k=1)[0]
 
     def _get_token_info(self, token: str) -> dict:
-        for t in self.tokens:
-            if t['instrument_name'].startswith(token):
-                return t
-        raise ValueError(f"Информация о токене {token} не найдена в tokens.json")
+        token_info = self._tokens_index.get(token)
+        if token_info is None:
+            raise ValueError(f"Информация о токене {token} не найдена в tokens.json")
+        return token_info
 
     def _decimals_from_step(self, step: float) -> int:
         return max(0, -math.floor(math.log10(step))) if step > 0 else 16
 
     def _find_data_wallet_by_derive(self, wallet: str) -> dict:
-        for account in self.wallets_data:
-            if account.get('derive_wallet') == wallet:
-                return account
-        raise ValueError(f"Кошелек {wallet} не найден в creds.json")
-    
-    def _split_amount(self, total_amount: float, num_short_accounts: int) -> list:
-
-        minimum_amount = self.token_info['amount_step'] # Для маркет ордеров minimum_amount не тот, который в API
-        amount_step = self.token_info['amount_step']
-
-        allowed_diff = 0  # Ноль!
-        
-        def round_down(value: float) -> float:
-            mod_step = value % amount_step
-            value -= mod_step
-            return value
-
-        dec_step = self._decimals_from_step(amount_step)
-        round_decimals = dec_step
-
-        # 0) Проверка на достаточность
-        if total_amount < minimum_amount * num_short_accounts:
-            raise ValueError("Недостаточная сумма для распределения по минимумам")
-
-        # Если всего 1 аккаунт:
-        if num_short_accounts == 1:
-            if total_amount < minimum_amount:
-                raise ValueError(f"Сумма {total_amount} < minimum_amount {minimum_amount}")
-            return [round(total_amount, round_decimals)]
-
-        # 1) Базовое равномерное распределение + шум
-        parts = [minimum_amount] * num_short_accounts
-        remaining = total_amount - sum(parts)
-        if remaining < 0:
-            raise ValueError("remaining < 0 — некорректные входные данные")
-
-        base = remaining / num_short_accounts if remaining > 0 else 0
-        raw = []
-        for _ in range(num_short_accounts):
-            # шум ±15%
-            coeff = random.uniform(-0.15, 0.15)
-            val = base + base * coeff
-            if val < 0:
-                val = 0
-            raw.append(val)
-
-        # Докидываем разницу в последний элемент
-        diff_base = remaining - sum(raw)
-        raw[-1] += diff_base
-
-        # Прибавляем к minimum_amount
-        for i in range(num_short_accounts):
-            raw[i] += minimum_amount
-
-        # Округление «вниз» для каждой части
-        for i in range(num_short_accounts):
-            down = round_down(raw[i])
-            if down < minimum_amount:
-                down = minimum_amount
-            raw[i] = round(down, round_decimals)
-
-        current_sum = round(sum(raw), round_decimals)
-        diff_now = round(total_amount - current_sum, round_decimals)
-
-        # Последний шаг по корректировки эмаунта по аккам, чтобы сумма сходилась
-        is_splitted = False
-        n_iterations = 10**6
-
-        for n in range(n_iterations):
-            for i in range(num_short_accounts):
-                adjustment = 0
-                
-                if diff_now < 0:
-                    adjustment = -amount_step
-                elif diff_now > 0:
-                    adjustment = amount_step
-                
-                new_val = raw[i] + adjustment
-                
-                if new_val + raw[i] < 0:
-                    continue
-                
-                diff_now -= round(adjustment, round_decimals)
-                raw[i] = round(new_val, round_decimals)
-
-                if round(diff_now, round_decimals) == 0.0:
-                    is_splitted = True
-                    break
-            if is_splitted:
-                break
-
-        if not is_splitted:
-            raise ValueError(
-                "Критическая ошибка: не получилось верно разбить сумму для шорта"
-            )
-
-
-        final_sum = round(sum(raw), round_decimals)
-        final_diff = round(total_amount - final_sum, round_decimals)
-
-        if abs(final_diff) > allowed_diff:
-            raise ValueError(
-                f"Критическая ошибка: итоговая сумма {final_sum} отличается от {total_amount} "
-                f"на {final_diff} (> {allowed_diff})"
-            )
-
-        random.shuffle(raw)
-
-        for x in raw:
-            if x < 0:
-                raise ValueError("Критическая ошибка: каким-то образом получилось отрицательное значение по amount")
-
-        return raw
+        account = self._wallets_index.get(wallet)
+        if account is None:
+            raise ValueError(f"Кошелек {wallet} не найден в creds.json")
+        return account
     
     def _calc_amount(self, instrument_ticker: dict) -> float:
         current_price = float(instrument_ticker['best_ask_price'])
@@ -202,79 +171,488 @@ class TradeManager:
         return amount_rounded
 
 
-    def open_delta_neutral_position(self, total_amount: float, instrument_ticker: dict) -> dict:
+    def _is_concurrent_hedge(self) -> bool:
+        return self.config.get("hedge_execution", {}).get("mode", "sequential") == "concurrent"
+
+    def _account_proxy(self, account: dict) -> dict:
+        return self._find_data_wallet_by_derive(account['derive_wallet'])['proxy']
+
+    def is_account_healthy(self, derive_wallet: str) -> bool:
+        account = self._wallets_index.get(derive_wallet)
+        return account is not None and proxy_health.is_healthy(account['proxy'])
+
+    def _build_fleet(self, candidates: list) -> FleetModel:
+        if not proxy_health.enabled:
+            return FleetModel.from_state(candidates)
+        proxies = [self._account_proxy(account) for account in candidates]
+        return FleetModel.from_state(
+            candidates,
+            healthy=[proxy_health.is_healthy(proxy) for proxy in proxies],
+            latency=[proxy_health.latency(proxy) for proxy in proxies]
+        )
+
+    def _plan_cycle(self, candidates: list, total_amount: float, instrument_ticker: dict) -> dict:
+        fleet = self._build_fleet(candidates)
+        args = (
+            total_amount,
+            self.num_accounts,
+            float(instrument_ticker['best_ask_price']),
+            self.config['leverage']['max'],
+            self.token_info['amount_step'],
+            self.config.get('split_noise', 0.15)
+        )
+
+        with metrics.timer("plan_cycle"):
+            try:
+                return fleet.plan_cycle(*args, rng=self.plan_rng)
+            except ValueError as e:
+                if fleet.healthy.all():
+                    raise
+                # Здоровых прокси не хватает — лучше медленный прокси, чем пропущенный цикл
+                logger.warning(f"Не удалось набрать аккаунты только со здоровыми прокси ({e}), учитываю все")
+                fleet.healthy[:] = True
+                return fleet.plan_cycle(*args, rng=self.plan_rng)
+
+    def prepare_open_legs(self, total_amount: float, instrument_ticker: dict, accounts: list = None) -> dict:
         if total_amount <= 0:
             raise ValueError("Сумма для торговли должна быть положительной.")
-        
-        selected_accounts = random.sample(self.state, self.num_accounts)
-        positions = {"long": {}, "short": {}}
-
-        long_account = random.choice(selected_accounts)
-        selected_accounts.remove(long_account)
-        
-        logger.info(f"Открытие лонга на аккаунте {long_account['derive_wallet']} на сумму {total_amount}")
-
-        long_wallet_data = self._find_data_wallet_by_derive(long_account['derive_wallet'])
-        open_long(long_wallet_data, instrument_ticker, total_amount)
-        
-        positions["long"][long_account['derive_wallet']] = total_amount
-
-        time.sleep(self._generate_random_param("delay_between_opening_hedge_position_sec"))
-        
-        num_short_accounts = self.num_accounts - 1
-        short_accounts = random.sample(selected_accounts, num_short_accounts)
-        short_amounts = self._split_amount(total_amount, num_short_accounts)
-        
-        for account, amount in zip(short_accounts, short_amounts):
-            logger.info(f"Открытие шорта на аккаунте {account['derive_wallet']} на сумму {amount}")
-            short_wallet_data = self._find_data_wallet_by_derive(account['derive_wallet'])
-            open_short(short_wallet_data, instrument_ticker, amount)
-            positions["short"][account['derive_wallet']] = amount
-
-            time.sleep(self._generate_random_param("delay_between_opening_hedge_position_sec"))
-
-        return positions
-    
-    def close_all_positions(self, opened_positions: dict, instrument_ticker: dict):
+
+        # Аккаунты и сплит подбираются так, чтобы каждая нога влезала в баланс аккаунта при макс. плече
+        plan = self._plan_cycle(self.state if accounts is None else accounts, total_amount, instrument_ticker)
+
+        # Все ноги подписываются до отправки лонга, чтобы EIP-712 не попадал в окно без хеджа
+        long_wallet_data = self._find_data_wallet_by_derive(plan['long'])
+        legs = {
+            "long": [prepare_order(long_wallet_data, instrument_ticker, total_amount, "long")],
+            "short": []
+        }
+        for wallet, amount in zip(plan['short'], plan['short_amounts']):
+            short_wallet_data = self._find_data_wallet_by_derive(wallet)
+            legs["short"].append(prepare_order(short_wallet_data, instrument_ticker, amount, "short"))
+
+        return legs
+
+    def prepare_close_legs(self, opened_positions: dict, instrument_ticker: dict) -> dict:
+        legs = {"long": [], "short": []}
         for wallet, amount in opened_positions['long'].items():
             wallet_data = self._find_data_wallet_by_derive(wallet)
-            logger.info(f"Закрытие лонга на {self.token} с аккаунта {wallet} на сумму {amount}")
-            open_short(wallet_data, instrument_ticker, amount)
+            legs["long"].append(prepare_order(wallet_data, instrument_ticker, amount, "short"))
 
         for wallet, amount in opened_positions['short'].items():
             wallet_data = self._find_data_wallet_by_derive(wallet)
-            logger.info(f"Закрытие шорта на {self.token} с аккаунта {wallet} на сумму {amount}")
-            open_long(wallet_data, instrument_ticker, amount)
+            legs["short"].append(prepare_order(wallet_data, instrument_ticker, amount, "long"))
+
+        return legs
+
+    def _submit_legs_concurrently(self, prepared_orders: list, record: CycleRecord, start_positions: dict = None) -> list:
+        max_workers = self.config.get("hedge_execution", {}).get("max_workers")
+        for order in prepared_orders:
+            order['cycle_id'] = record.cycle_id
+        self.cycle_wal.log_intents(record.cycle_id, prepared_orders)
+        responses, unhedged_window = submit_orders_concurrently(prepared_orders, max_workers=max_workers)
+
+        fills = [record.add(parse_order_response(response, order)) for response, order in zip(responses, prepared_orders)]
+        fills = self._confirm_unknown_fills(fills, record, start_positions)
+        self.cycle_wal.log_fills(record.cycle_id, fills)
+        self._journal_fills(fills, prepared_orders)
+        order_event(
+            "INFO", "Время от первого до последнего исполнения ног: {unhedged_window_ms:.1f} мс",
+            cycle_id=record.cycle_id, instrument=record.instrument_name, legs=len(fills), unhedged_window_ms=unhedged_window * 1000
+        )
+        for fill in fills:
+            self._log_fill(fill, record)
+        return fills
+
+    def _submit_leg(self, prepared_order: dict, record: CycleRecord) -> OrderFill:
+        prepared_order['cycle_id'] = record.cycle_id
+        self.cycle_wal.log_intents(record.cycle_id, [prepared_order])
+        fill = record.add(parse_order_response(submit_order(prepared_order), prepared_order))
+        fill, = self._confirm_unknown_fills([fill], record)
+        self.cycle_wal.log_fills(record.cycle_id, [fill])
+        self._journal_fills([fill], [prepared_order])
+        self._log_fill(fill, record)
+        return fill
+
+    def _confirm_unknown_fills(self, fills: list, record: CycleRecord, start_positions: dict = None) -> list:
+        # По 5xx/не JSON ордер мог исполниться: объем берем из позиции аккаунта за вычетом уже известных ног цикла.
+        # Пока объем не сверен, fill не пишется в WAL, и при падении нога восстановится как pending через API
+        unknown = [fill for fill in fills if fill.status == UNKNOWN_STATUS]
+        if not unknown:
+            return fills
+
+        wallets = list(dict.fromkeys(fill.derive_wallet for fill in unknown))
+        logger.warning(f"Цикл {record.cycle_id}: исход ордеров на аккаунтах {wallets} неизвестен ({unknown[0].error}), сверяю позиции с API")
+        infos = dict(zip(wallets, fetch_accounts_info([self._find_data_wallet_by_derive(wallet) for wallet in wallets])))
+
+        def signed(fill: OrderFill) -> Decimal:
+            filled = Decimal(str(fill.filled_amount))
+            return filled if fill.direction == "buy" else -filled
+
+        confirmed = {}
+        for fill in unknown:
+            key = (fill.derive_wallet, fill.instrument_name)
+            position = sum((Decimal(str(x['amount'])) for x in infos[fill.derive_wallet]['positions'] if x['instrument_name'] == fill.instrument_name), Decimal(0))
+            known = Decimal(str((start_positions or {}).get(key, 0))) + sum(
+                (signed(x) for x in record.fills if (x.derive_wallet, x.instrument_name) == key and x.status != UNKNOWN_STATUS),
+                Decimal(0)
+            )
+            delta = position - known if fill.direction == "buy" else known - position
+            filled = float(min(max(delta, Decimal(0)), Decimal(str(fill.requested_amount))))
+
+            # Заменяем в записи сразу: следующая неизвестная нога того же аккаунта учтет эту как известную
+            confirmed[id(fill)] = fill._replace(filled_amount=filled, status="filled" if filled > 0 else "rejected", error="" if filled > 0 else fill.error)
+            record.fills[next(i for i, x in enumerate(record.fills) if x is fill)] = confirmed[id(fill)]
+            logger.warning(f"Цикл {record.cycle_id}: по позиции аккаунта {fill.derive_wallet} нога {fill.direction} исполнена на {filled} из {fill.requested_amount}")
+
+        return [confirmed.get(id(fill), fill) for fill in fills]
+
+    def _journal_fills(self, fills: list, prepared_orders: list):
+        # Журнал пишет уже разобранные ноги, запись на диск идет в его собственном потоке
+        if not self.journal:
+            return
+        for fill, order in zip(fills, prepared_orders):
+            self.journal.append(fill, cycle_id=order.get('cycle_id', ""), reduce_only=order.get('reduce_only', False))
+
+    def _log_fill(self, fill: OrderFill, record: CycleRecord):
+        fields = {
+            "cycle_id": record.cycle_id,
+            "account": fill.derive_wallet,
+            "instrument": fill.instrument_name,
+            "leg": fill.direction,
+            "requested": fill.requested_amount,
+            "filled": fill.filled_amount,
+            "latency_ms": fill.latency_ms
+        }
+        if fill.error:
+            order_event("WARNING", "Ордер на аккаунте {account} отклонен: {error}", error=fill.error, **fields)
+        elif fill.filled_amount < fill.requested_amount:
+            order_event("WARNING", "Ордер на аккаунте {account} исполнен частично: {filled} из {requested}", **fields)
+        else:
+            order_event("DEBUG", "Нога {leg} {filled} {instrument} на аккаунте {account} исполнена за {latency_ms:.1f} мс", **fields)
+
+    def _allocate_topup(self, record: CycleRecord, orders: list, units: int, instrument_ticker: dict) -> list:
+        # Добор идет на аккаунты ноги, которые недобрали, но не больше запаса по плечу (FleetModel.max_units
+        # за вычетом уже набранного в цикле). Что не влезло — на остальные аккаунты ноги с запасом
+        amount_step = self.token_info['amount_step']
+        direction = orders[0]['direction']
+        wallets = [order['wallet_data']['derive_wallet'] for order in orders]
+        filled = record.filled_by_wallet(direction)
+
+        fleet = FleetModel.from_state([self.state_store.get(wallet) for wallet in wallets])
+        cycle_units = np.array([to_step_units(filled.get(wallet, 0), amount_step) for wallet in wallets], dtype=np.int64)
+        max_units = fleet.max_units(float(instrument_ticker['best_ask_price']), self.config['leverage']['max'], amount_step)
+        headroom = np.maximum(max_units - cycle_units, 0)
+        underfill = np.maximum(np.array([to_step_units(order['amount'], amount_step) for order in orders]) - cycle_units, 0)
+
+        def take(caps: np.ndarray, needed: int) -> np.ndarray:
+            return np.minimum(caps, np.maximum(needed - (np.cumsum(caps) - caps), 0))
+
+        allocation = take(np.minimum(underfill, headroom), units)
+        allocation += take(headroom - allocation, units - int(allocation.sum()))
+        if allocation.sum() < units:
+            raise ValueError(
+                f"Не хватает запаса по плечу для добора {from_step_units(units, amount_step)} в цикле {record.cycle_id}: "
+                f"запас {dict(zip(wallets, headroom.tolist()))} шагов"
+            )
+        return [(order['wallet_data'], from_step_units(int(x), amount_step)) for order, x in zip(orders, allocation) if x > 0]
+
+    def _reconcile_hedge(self, record: CycleRecord, legs: dict, instrument_ticker: dict):
+        amount_step = self.token_info['amount_step']
+
+        for attempt in range(self.MAX_TOPUP_ATTEMPTS + 1):
+            diff = to_step_units(record.filled_total("buy"), amount_step) - to_step_units(record.filled_total("sell"), amount_step)
+            if diff == 0:
+                return
+            if attempt == self.MAX_TOPUP_ATTEMPTS:
+                break
+
+            # Шорты недобрали — дошортиваем на шорт-аккаунтах, лонг недобрал — докупаем на лонг-аккаунте
+            direction = "short" if diff > 0 else "long"
+            orders = legs["short"] if diff > 0 else legs["long"]
+            for wallet_data, amount in self._allocate_topup(record, orders, abs(diff), instrument_ticker):
+                logger.warning(f"Дельта цикла {record.cycle_id} не нулевая, корректирующий {direction} {amount} на аккаунте {wallet_data['derive_wallet']}")
+                self._submit_leg(prepare_order(wallet_data, instrument_ticker, amount, direction), record)
+
+        raise ValueError(
+            f"Не удалось выровнять дельту цикла {record.cycle_id}: "
+            f"куплено {record.filled_total('buy')}, продано {record.filled_total('sell')}"
+        )
+
+    def open_delta_neutral_position(self, total_amount: float, instrument_ticker: dict, legs: dict = None) -> dict:
+        with metrics.timer("open_delta_neutral_position"):
+            return self._open_delta_neutral_position(total_amount, instrument_ticker, legs)
+
+    def _open_delta_neutral_position(self, total_amount: float, instrument_ticker: dict, legs: dict = None) -> dict:
+        if legs is None:
+            legs = self.prepare_open_legs(total_amount, instrument_ticker)
+
+        record = CycleRecord(instrument_ticker['instrument_name'])
+        self.cycle_record = record
+        long_order = legs["long"][0]
+        long_wallet = long_order['wallet_data']['derive_wallet']
+
+        if self._is_concurrent_hedge():
+            order_event(
+                "INFO", "Одновременная отправка лонга {long_amount} на аккаунте {account} и шортов {short_amounts} на аккаунтах {short_accounts}",
+                cycle_id=record.cycle_id, instrument=record.instrument_name, account=long_wallet, long_amount=long_order['amount'],
+                short_amounts=[x['amount'] for x in legs['short']], short_accounts=[x['wallet_data']['derive_wallet'] for x in legs['short']]
+            )
+            self._submit_legs_concurrently(legs["long"] + legs["short"], record)
+        else:
+            order_event(
+                "INFO", "Открытие лонга на аккаунте {account} на сумму {amount}",
+                cycle_id=record.cycle_id, instrument=record.instrument_name, leg="buy", account=long_wallet, amount=long_order['amount']
+            )
+            self._submit_leg(long_order, record)
+
+            self._sleep(self._generate_random_param("delay_between_opening_hedge_position_sec"))
+
+            for order in legs["short"]:
+                order_event(
+                    "INFO", "Открытие шорта на аккаунте {account} на сумму {amount}",
+                    cycle_id=record.cycle_id, instrument=record.instrument_name, leg="sell",
+                    account=order['wallet_data']['derive_wallet'], amount=order['amount']
+                )
+                self._submit_leg(order, record)
+
+                self._sleep(self._generate_random_param("delay_between_opening_hedge_position_sec"))
+
+        self._reconcile_hedge(record, legs, instrument_ticker)
+        logger.info(f"Цикл {record.cycle_id} открыт: {record.summary()}")
+
+        # В позиции пишем фактически исполненное, а не запрошенное
+        return {"long": record.filled_by_wallet("buy"), "short": record.filled_by_wallet("sell")}
+
+    def _complete_close_legs(self, fills: list, prepared_orders: list, record: CycleRecord):
+        amount_step = self.token_info['amount_step']
+
+        for fill, order in zip(fills, prepared_orders):
+            for attempt in range(self.MAX_TOPUP_ATTEMPTS + 1):
+                remaining = to_step_units(fill.requested_amount, amount_step) - to_step_units(fill.filled_amount, amount_step)
+                if remaining <= 0:
+                    break
+                if attempt == self.MAX_TOPUP_ATTEMPTS:
+                    raise ValueError(f"Не удалось закрыть позицию на аккаунте {fill.derive_wallet} в цикле {record.cycle_id}")
+
+                direction = "long" if order['direction'] == "buy" else "short"
+                amount = from_step_units(remaining, amount_step)
+                logger.warning(f"Закрытие на аккаунте {fill.derive_wallet} исполнено не полностью, дозакрываю {amount}")
+                order = prepare_order(order['wallet_data'], order['instrument_ticker'], amount, direction)
+                fill = self._submit_leg(order, record)
+
+    def close_all_positions(self, opened_positions: dict, instrument_ticker: dict, legs: dict = None):
+        if legs is None:
+            legs = self.prepare_close_legs(opened_positions, instrument_ticker)
+
+        record = self.cycle_record or CycleRecord(instrument_ticker['instrument_name'])
+        prepared_orders = legs["long"] + legs["short"]
+
+        if self._is_concurrent_hedge():
+            order_event("INFO", "Одновременное закрытие всех ног на {token}", cycle_id=record.cycle_id, instrument=record.instrument_name, token=self.token)
+            fills = self._submit_legs_concurrently(prepared_orders, record)
+        else:
+            fills = []
+            for order in legs["long"]:
+                order_event(
+                    "INFO", "Закрытие лонга на {token} с аккаунта {account} на сумму {amount}",
+                    cycle_id=record.cycle_id, instrument=record.instrument_name, leg="sell", token=self.token,
+                    account=order['wallet_data']['derive_wallet'], amount=order['amount']
+                )
+                fills.append(self._submit_leg(order, record))
+
+            for order in legs["short"]:
+                order_event(
+                    "INFO", "Закрытие шорта на {token} с аккаунта {account} на сумму {amount}",
+                    cycle_id=record.cycle_id, instrument=record.instrument_name, leg="buy", token=self.token,
+                    account=order['wallet_data']['derive_wallet'], amount=order['amount']
+                )
+                fills.append(self._submit_leg(order, record))
+
+        self._complete_close_legs(fills, prepared_orders, record)
+        self.cycle_wal.log_closed(record.cycle_id)
+        logger.info(f"Цикл {record.cycle_id} закрыт: {record.summary()}")
 
     def close_all_positions_with_api_info(self):
+        if self.config.get("emergency_close", {}).get("mode", "sequential") == "parallel":
+            self._close_all_positions_parallel()
+        else:
+            self._close_all_positions_sequential()
+        self.cycle_wal.log_closed_all()
+
+    def _close_all_positions_sequential(self):
         logger.info(f"Экстренное закрытие всех позиций...")
         for wallet_data in self.wallets_data:
             account_info = get_account_info(wallet_data)
             for position in account_info['positions']:
-                logger.info(f"Закрытие {float(position['amount'])} {self.token} на аккаунте {wallet_data['derive_wallet']}")
-                instrument_ticker = get_instrument_ticker(position['instrument_name'].replace('-PERP', ''))
+                instrument_name = position['instrument_name']
+                if not instrument_name.endswith('-PERP'):
+                    logger.error(f"Позиция по {instrument_name} на аккаунте {wallet_data['derive_wallet']} не PERP, закройте ее вручную")
+                    continue
+                if instrument_name not in self._tokens_index:
+                    logger.warning(f"Инструмента {instrument_name} нет в tokens.json, закрываю по тикеру из API")
+
+                logger.info(f"Закрытие {float(position['amount'])} {instrument_name} на аккаунте {wallet_data['derive_wallet']}")
+                instrument_ticker = self.market_data.get_ticker(instrument_name.replace('-PERP', ''))
                 position_amount = float(position['amount'])
                 if position_amount < 0:
-                    open_long(wallet_data, instrument_ticker, position_amount * -1) # Потому что в респонсе отрицательное значение через API при шорте 
+                    prepared_order = prepare_order(wallet_data, instrument_ticker, position_amount * -1, "long") # Потому что в респонсе отрицательное значение через API при шорте 
                 else:
-                    open_short(wallet_data, instrument_ticker, position_amount)
+                    prepared_order = prepare_order(wallet_data, instrument_ticker, position_amount, "short")
+                self._journal_fills([parse_order_response(submit_order(prepared_order), prepared_order)], [prepared_order])
         logger.info(f"Все позиции закрыты.")
 
 
-    def start(self):
-        while True:
-            try:
-                instrument_ticker = get_instrument_ticker(self.token)
-                total_amount = self._calc_amount(instrument_ticker)
+    def _collect_open_positions(self, max_workers: int) -> list:
+        infos = fetch_accounts_info(self.wallets_data, max_workers=max_workers)
 
-                opened_positions = self.open_delta_neutral_position(
-                    total_amount=total_amount,
-                    instrument_ticker=instrument_ticker
+        open_positions = []
+        for wallet_data, account_info in zip(self.wallets_data, infos):
+            for position in account_info['positions']:
+                instrument_name = position['instrument_name']
+                if float(position['amount']) == 0:
+                    continue
+                if not instrument_name.endswith('-PERP'):
+                    logger.error(f"Позиция по {instrument_name} на аккаунте {wallet_data['derive_wallet']} не PERP, закройте ее вручную")
+                    continue
+                open_positions.append((wallet_data, instrument_name, float(position['amount'])))
+        return open_positions
+
+    def _close_all_positions_parallel(self):
+        settings = {"max_workers": 16, "max_rounds": 5, "poll_delay_sec": 1, **self.config.get("emergency_close", {})}
+        logger.info(f"Экстренное параллельное закрытие всех позиций...")
+        started_at = time.perf_counter()
+
+        for round_number in range(1, settings['max_rounds'] + 1):
+            open_positions = self._collect_open_positions(settings['max_workers'])
+
+            exposure = {}
+            for _, instrument_name, amount in open_positions:
+                net, gross = exposure.get(instrument_name, (0.0, 0.0))
+                exposure[instrument_name] = (net + amount, gross + abs(amount))
+
+            if not open_positions:
+                logger.info(f"Все позиции закрыты за {time.perf_counter() - started_at:.2f} сек, раундов: {round_number - 1}")
+                return
+
+            for instrument_name, (net, gross) in exposure.items():
+                logger.info(f"Раунд {round_number}: {instrument_name} нетто {net:.6f}, брутто {gross:.6f}")
+
+            # Один тикер на инструмент, общий для всех аккаунтов
+            tickers = {
+                instrument_name: self.market_data.get_ticker(instrument_name.replace('-PERP', ''))
+                for instrument_name in exposure
+            }
+            prepared_orders = [
+                prepare_order(
+                    wallet_data,
+                    tickers[instrument_name],
+                    abs(amount),
+                    "long" if amount < 0 else "short", # Потому что в респонсе отрицательное значение через API при шорте
+                    reduce_only=True
                 )
+                for wallet_data, instrument_name, amount in open_positions
+            ]
+            responses, _ = submit_orders_concurrently(prepared_orders, max_workers=settings['max_workers'])
+            self._journal_fills([parse_order_response(response, order) for response, order in zip(responses, prepared_orders)], prepared_orders)
+            get_clock().sleep(settings['poll_delay_sec'])
+
+        open_positions = self._collect_open_positions(settings['max_workers'])
+        if open_positions:
+            raise ValueError(
+                f"Не удалось закрыть все позиции за {settings['max_rounds']} раундов, осталось: "
+                f"{[(x[0]['derive_wallet'], x[1], x[2]) for x in open_positions]}"
+            )
+        logger.info(f"Все позиции закрыты за {time.perf_counter() - started_at:.2f} сек")
+
+    def recover_open_cycles(self):
+        # Восстановление после падения по write-ahead логу: закрываем только ноги незавершенных циклов
+        open_cycles = self.cycle_wal.open_cycles()
+        if not open_cycles:
+            return
+
+        for cycle_id, cycle in open_cycles.items():
+            positions = dict(cycle['positions'])
+            if cycle['pending']:
+                # Ответ на эти ноги не успел записаться, их позицию спрашиваем у API, но только у этих аккаунтов
+                logger.warning(f"Цикл {cycle_id}: нет ответа по ногам {cycle['pending']}, запрашиваю позиции у API")
+                accounts = [self._find_data_wallet_by_derive(wallet) for wallet, _ in cycle['pending']]
+                for (wallet, instrument_name), info in zip(cycle['pending'], fetch_accounts_info(accounts)):
+                    amounts = [float(x['amount']) for x in info['positions'] if x['instrument_name'] == instrument_name]
+                    positions[(wallet, instrument_name)] = sum(amounts)
+
+            logger.warning(f"Незавершенный цикл {cycle_id} в {self.cycle_wal.path}, закрываю позиции: {positions}")
+            self._close_recovered_positions(cycle_id, positions)
+            self.cycle_wal.log_closed(cycle_id)
+
+        logger.info(f"Восстановление завершено, закрыто циклов: {len(open_cycles)}")
+
+    def _close_recovered_positions(self, cycle_id: str, positions: dict):
+        tickers = {}
+        for attempt in range(self.MAX_TOPUP_ATTEMPTS + 1):
+            open_positions = {key: amount for key, amount in positions.items() if amount != 0}
+            if not open_positions:
+                return
+            if attempt == self.MAX_TOPUP_ATTEMPTS:
+                raise ValueError(f"Не удалось закрыть позиции цикла {cycle_id}: {open_positions}, запустите close_all_positions.py")
+
+            prepared_orders = []
+            for (wallet, instrument_name), amount in open_positions.items():
+                if instrument_name not in tickers:
+                    tickers[instrument_name] = self.market_data.get_ticker(instrument_name.replace('-PERP', ''))
+                prepared_orders.append(prepare_order(
+                    self._find_data_wallet_by_derive(wallet),
+                    tickers[instrument_name],
+                    abs(amount),
+                    "long" if amount < 0 else "short",
+                    reduce_only=True
+                ))
+
+            record = CycleRecord(prepared_orders[0]['instrument_ticker']['instrument_name'])
+            record.cycle_id = cycle_id
+            for fill in self._submit_legs_concurrently(prepared_orders, record, start_positions=dict(positions)):
+                key = (fill.derive_wallet, fill.instrument_name)
+                filled = Decimal(str(fill.filled_amount))
+                positions[key] = float(Decimal(str(positions[key])) + (filled if fill.direction == "buy" else -filled))
+
+    def _wait_and_prepare_close(self, opened_positions: dict) -> tuple:
+        # Закрывающие ноги подписываем незадолго до закрытия, по свежему тикеру из кэша
+        lead = min(self.CLOSE_PRESIGN_LEAD_SEC, self.delay_open_close)
+        self._sleep(self.delay_open_close - lead)
+
+        instrument_ticker = self.market_data.get_ticker(self.token)
+        close_legs = self.prepare_close_legs(opened_positions, instrument_ticker)
+
+        self._sleep(lead)
+        return close_legs, instrument_ticker
+
+    def run_cycle(self, accounts: list = None) -> dict:
+        instrument_ticker = self.market_data.get_ticker(self.token)
+        total_amount = self._calc_amount(instrument_ticker)
+
+        open_legs = self.prepare_open_legs(total_amount, instrument_ticker, accounts=accounts)
+        opened_positions = self.open_delta_neutral_position(
+            total_amount=total_amount,
+            instrument_ticker=instrument_ticker,
+            legs=open_legs
+        )
 
-                time.sleep(self.delay_open_close)
-                self.close_all_positions(opened_positions, instrument_ticker)
-                time.sleep(self.delay_between_positions)
+        close_legs, close_ticker = self._wait_and_prepare_close(opened_positions)
+        self.close_all_positions(opened_positions, close_ticker, legs=close_legs)
+
+        return {
+            "cycle_id": self.cycle_record.cycle_id,
+            "token": self.token,
+            "amount": total_amount,
+            "notional_usd": sum(opened_positions['long'].values()) * float(instrument_ticker['best_ask_price']),
+            "fees": sum(x.fee for x in self.cycle_record.fills),
+            "accounts": list(opened_positions['long']) + list(opened_positions['short'])
+        }
+
+    def start(self):
+        while True:
+            try:
+                self.run_cycle()
+                get_clock().sleep(self.delay_between_positions)
                 self._update_states()
                 check_balance(from_api=False)
 
@@ -1,6 +1,51 @@
-from .initial_checks import start_checks, check_balance
-from .initial_data_extract import  extract_data
-from .state import update_accounts_state, get_account_info
-from .trade import open_long, open_short, get_instrument_ticker
-from .tokens import update_tokens_info
-from .logger import logger
\ No newline at end of file
+import importlib
+
+from .logger import logger
+
+# Подмодули грузятся при первом обращении к имени: `from utils import update_tokens_info` не тянет
+# за собой eth_account, web3, numpy и websocket, которые нужны только торговым командам
+_EXPORTS = {
+    "start_checks": "initial_checks",
+    "check_balance": "initial_checks",
+    "validate_proxy_async": "initial_checks",
+    "extract_data": "initial_data_extract",
+    "update_accounts_state": "state",
+    "get_account_info": "state",
+    "get_all_portfolios": "state",
+    "fetch_accounts_info": "state",
+    "get_account_info_async": "state",
+    "get_all_portfolios_async": "state",
+    "fetch_accounts_info_async": "state",
+    "AccountStateStore": "state_store",
+    "get_state_store": "state_store",
+    "open_long": "trade",
+    "open_short": "trade",
+    "get_instrument_ticker": "trade",
+    "prepare_order": "trade",
+    "submit_order": "trade",
+    "submit_orders_concurrently": "trade",
+    "open_long_async": "trade",
+    "open_short_async": "trade",
+    "get_instrument_ticker_async": "trade",
+    "submit_order_async": "trade",
+    "submit_orders_concurrently_async": "trade",
+    "update_tokens_info": "tokens",
+    "update_tokens_info_async": "tokens",
+    "MarketData": "market_data",
+    "TickerCache": "market_data",
+}
+
+__all__ = ["logger", *_EXPORTS]
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return __all__
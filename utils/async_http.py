@@ -0,0 +1,176 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from utils.rate_limit import RateLimiter, RetryBudget
+
+# 429 и 503 означают, что запрос не обработан, их можно повторять и для ордеров.
+# 500/502/504 и обрывы после отправки повторяются только для идемпотентных запросов
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+NOT_PROCESSED_STATUSES = (429, 503)
+
+
+class HttpStatusError(Exception):
+    pass
+
+
+class HttpResponse:
+    # Тело читается целиком внутри event loop, дальше ответ можно отдавать в любой поток
+    def __init__(self, status_code: int, text: str, headers: dict, elapsed: float = 0.0):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        # Время последней попытки в секундах, как requests.Response.elapsed (но float)
+        self.elapsed = elapsed
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HttpStatusError(f"HTTP {self.status_code}: {self.text[:200]}")
+
+
+def proxy_url(proxy: dict) -> str:
+    return proxy.get('https') or proxy.get('http') if proxy else None
+
+
+class AsyncHttpClient:
+    def __init__(self, pool_connections: int, pool_maxsize: int, timeout_sec: float, retries: int, backoff_factor: float,
+                 max_backoff_sec: float = 5, retry_budget_ratio: float = 0.2, rate_limiter: RateLimiter = None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout_sec = timeout_sec
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff_sec = max_backoff_sec
+        self.rate_limiter = rate_limiter
+        self.retry_budget = RetryBudget(retry_budget_ratio)
+
+        self._sessions = {}
+        # Колбэки observer(proxy, seconds, ok) на каждый запрос, например трекер здоровья прокси
+        self.observers = []
+
+    def _notify(self, proxy: dict, seconds: float, ok: bool):
+        for observer in self.observers:
+            observer(proxy, seconds, ok)
+
+    def session(self, proxy: dict = None) -> aiohttp.ClientSession:
+        # Одна keep-alive сессия на прокси в рамках event loop, хосты пулятся коннектором
+        key = (asyncio.get_running_loop(), proxy_url(proxy) or "")
+        session = self._sessions.get(key)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_connections * self.pool_maxsize,
+                limit_per_host=self.pool_maxsize
+            )
+            session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout_sec))
+            self._sessions[key] = session
+        return session
+
+    def _backoff(self, attempt: int, response: HttpResponse = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(self.max_backoff_sec, float(retry_after))
+            except ValueError:
+                pass
+        # Full jitter: ретраи разных аккаунтов не приходят на биржу одной пачкой
+        return random.uniform(0, min(self.max_backoff_sec, self.backoff_factor * 2 ** attempt))
+
+    async def request(self, method: str, url: str, json: dict = None, data: str = None, headers: dict = None, proxy: dict = None,
+                      timeout: float = None, idempotent: bool = True, retries: int = None) -> HttpResponse:
+        # idempotent=False для ордеров: повторяется то же тело с тем же nonce и подписью и только если биржа его точно не обработала.
+        # retries переопределяет число повторов из настроек для отдельного запроса
+        session = self.session(proxy)
+        request_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout_sec)
+        endpoint = urlsplit(url).path
+        wallet = (headers or {}).get("X-LyraWallet")
+        retry_statuses = RETRY_STATUSES if idempotent else NOT_PROCESSED_STATUSES
+        retries = self.retries if retries is None else retries
+        self.retry_budget.deposit()
+
+        for attempt in range(retries + 1):
+            if self.rate_limiter:
+                await self.rate_limiter.acquire(endpoint, wallet)
+
+            response = None
+            started_at = time.perf_counter()
+            try:
+                async with session.request(
+                    method,
+                    url,
+                    json=json,
+                    data=data,
+                    headers=headers,
+                    proxy=proxy_url(proxy),
+                    timeout=request_timeout
+                ) as raw_response:
+                    response = HttpResponse(
+                        raw_response.status,
+                        await raw_response.text(),
+                        dict(raw_response.headers),
+                        time.perf_counter() - started_at
+                    )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._notify(proxy, time.perf_counter() - started_at, False)
+                # До биржи запрос не дошел (ClientConnectorError) — повторять безопасно всегда
+                retryable = idempotent or isinstance(e, aiohttp.ClientConnectorError)
+                if not retryable or attempt == retries or not self.retry_budget.withdraw():
+                    raise
+            else:
+                self._notify(proxy, time.perf_counter() - started_at, response.status_code not in RETRY_STATUSES)
+                if response.status_code not in retry_statuses or attempt == retries or not self.retry_budget.withdraw():
+                    return response
+
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    async def post(self, url: str, json: dict = None, headers: dict = None, proxy: dict = None, timeout: float = None, data: str = None,
+                   idempotent: bool = True, retries: int = None) -> HttpResponse:
+        return await self.request("POST", url, json=json, data=data, headers=headers, proxy=proxy, timeout=timeout, idempotent=idempotent,
+                                  retries=retries)
+
+    async def get(self, url: str, headers: dict = None, proxy: dict = None, timeout: float = None) -> HttpResponse:
+        return await self.request("GET", url, headers=headers, proxy=proxy, timeout=timeout)
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        for key, session in list(self._sessions.items()):
+            if key[0] is loop:
+                await session.close()
+                del self._sessions[key]
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_io_loop() -> asyncio.AbstractEventLoop:
+    # Общий event loop в фоновом потоке: синхронные обертки из любых потоков отправляют корутины сюда
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-io", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro):
+    loop = get_io_loop()
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+
+    if running_loop is loop:
+        coro.close()
+        raise RuntimeError("Синхронную обертку нельзя вызывать из async-io потока, используйте *_async версию")
+
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+class Clock:
+    # Реальное время. Паузы между циклами и ногами идут через часы, чтобы бумажная торговля могла их сжать
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float, stop_event: threading.Event = None) -> bool:
+        # True, если ожидание прервано stop_event
+        if stop_event is None:
+            time.sleep(max(0, seconds))
+            return False
+        return stop_event.wait(max(0, seconds))
+
+
+class VirtualClock(Clock):
+    # Виртуальное время симуляции: идет в speed раз быстрее реального, при speed=0 sleep перескакивает мгновенно
+    def __init__(self, start: float, speed: float = 0):
+        self.start = start
+        self.speed = speed
+        self._skipped = 0.0
+        self._started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        elapsed = (time.monotonic() - self._started_at) * self.speed if self.speed else 0.0
+        with self._lock:
+            return self.start + elapsed + self._skipped
+
+    def sleep(self, seconds: float, stop_event: threading.Event = None) -> bool:
+        if stop_event is not None and stop_event.is_set():
+            return True
+        if self.speed:
+            return super().sleep(seconds / self.speed, stop_event)
+        with self._lock:
+            self._skipped += max(0, seconds)
+        return False
+
+
+_clock = Clock()
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+def set_clock(clock: Clock):
+    global _clock
+    _clock = clock
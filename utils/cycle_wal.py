@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from decimal import Decimal
+
+from utils.misc import load_json
+
+WAL_PATH = "./data/cycles.wal"
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "path": WAL_PATH
+}
+
+
+class CycleWal:
+    # Write-ahead лог циклов: намерения (ноги до отправки), исполнения и закрытие цикла.
+    # Каждая запись — строка JSON, дописанная через fsync. Когда открытых циклов нет, лог обнуляется
+    def __init__(self, path: str = WAL_PATH, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    def _append(self, records: list):
+        if not self.enabled or not records:
+            return
+        data = "".join(json.dumps(record) + "\n" for record in records).encode()
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def log_intents(self, cycle_id: str, prepared_orders: list):
+        # Пишется до отправки: если процесс упадет до ответа, будет видно, какие аккаунты проверить
+        self._append([{
+            "type": "intent",
+            "ts": time.time(),
+            "cycle_id": cycle_id,
+            "legs": [
+                [order['wallet_data']['derive_wallet'], order['instrument_ticker']['instrument_name'], order['direction'], str(order['amount'])]
+                for order in prepared_orders
+            ]
+        }])
+
+    def log_fills(self, cycle_id: str, fills: list):
+        self._append([{
+            "type": "fill",
+            "ts": time.time(),
+            "cycle_id": cycle_id,
+            "legs": [[fill.derive_wallet, fill.instrument_name, fill.direction, str(fill.filled_amount)] for fill in fills]
+        }])
+
+    def log_closed(self, cycle_id: str):
+        self._append([{"type": "closed", "ts": time.time(), "cycle_id": cycle_id}])
+        self._compact()
+
+    def log_closed_all(self):
+        # После экстренного закрытия по API все циклы закрыты
+        self._append([{"type": "closed_all", "ts": time.time()}])
+        self._compact()
+
+    def _read(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as file:
+            lines = file.read().split("\n")
+
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Недописанная строка при падении посреди записи
+                continue
+        return records
+
+    def open_cycles(self) -> dict:
+        cycles = {}
+        for record in self._read():
+            if record['type'] == "closed_all":
+                cycles.clear()
+                continue
+            if record['type'] == "closed":
+                cycles.pop(record['cycle_id'], None)
+                continue
+
+            cycle = cycles.setdefault(record['cycle_id'], {"positions": {}, "pending": {}})
+            for wallet, instrument_name, direction, amount in record['legs']:
+                key = (wallet, instrument_name)
+                if record['type'] == "intent":
+                    cycle['pending'][key] = cycle['pending'].get(key, 0) + 1
+                    cycle['positions'].setdefault(key, Decimal(0))
+                else:
+                    cycle['pending'][key] = cycle['pending'].get(key, 0) - 1
+                    sign = 1 if direction == "buy" else -1
+                    cycle['positions'][key] = cycle['positions'].get(key, Decimal(0)) + sign * Decimal(amount)
+
+        # pending — ноги, отправленные без записанного ответа: их фактическую позицию знает только API
+        return {
+            cycle_id: {
+                "positions": {key: float(amount) for key, amount in cycle['positions'].items()},
+                "pending": [key for key, count in cycle['pending'].items() if count > 0]
+            }
+            for cycle_id, cycle in cycles.items()
+        }
+
+    def _compact(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.open_cycles():
+                return
+            fd = os.open(self.path, os.O_WRONLY | os.O_TRUNC | os.O_CREAT, 0o644)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+_wal = None
+_wal_lock = threading.Lock()
+
+
+def get_cycle_wal() -> CycleWal:
+    global _wal
+    if _wal is None:
+        with _wal_lock:
+            if _wal is None:
+                settings = {**DEFAULT_SETTINGS, **load_json("./config.json").get("cycle_wal", {})}
+                _wal = CycleWal(settings['path'], settings['enabled'])
+    return _wal
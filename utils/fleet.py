@@ -0,0 +1,104 @@
+import numpy as np
+
+from utils.split import to_step_units, from_step_units
+
+
+class FleetModel:
+    # Снимок флота в массивах: балансы, открытый номинал, здоровье и латентность прокси.
+    # Отбор аккаунтов, их макс. размер и сплит цикла считаются векторно, без цикла по аккаунтам
+    def __init__(self, wallets: list, balances, open_notional=None, healthy=None, latency=None):
+        self.wallets = np.array(wallets, dtype=object)
+        self.balances = np.asarray(balances, dtype=np.float64)
+        size = len(self.wallets)
+        self.open_notional = np.zeros(size) if open_notional is None else np.asarray(open_notional, dtype=np.float64)
+        self.healthy = np.ones(size, dtype=bool) if healthy is None else np.asarray(healthy, dtype=bool)
+        self.latency = np.zeros(size) if latency is None else np.asarray(latency, dtype=np.float64)
+
+    @classmethod
+    def from_state(cls, accounts: list, healthy: list = None, latency: list = None) -> "FleetModel":
+        return cls(
+            [account['derive_wallet'] for account in accounts],
+            [float(account['subaccount_value']) for account in accounts],
+            [float(account.get('open_notional_usd', 0)) for account in accounts],
+            healthy,
+            latency
+        )
+
+    def max_units(self, price: float, max_leverage: float, amount_step: float) -> np.ndarray:
+        # Сколько шагов amount_step аккаунт еще может взять при макс. плече с учетом уже открытого номинала
+        capacity_usd = np.maximum(self.balances * max_leverage - self.open_notional, 0)
+        return np.floor(capacity_usd / (price * amount_step) + 1e-9).astype(np.int64)
+
+    def leverage_violations(self, max_nominal_value: float, max_leverage: float) -> np.ndarray:
+        with np.errstate(divide="ignore"):
+            current_max_leverage = np.round(max_nominal_value / np.round(self.balances, 3), 2)
+        return np.flatnonzero(current_max_leverage > max_leverage)
+
+    @staticmethod
+    def split_units(total_units: int, caps: np.ndarray, noise: float = 0.15, rng=None) -> np.ndarray:
+        # Минимум один шаг на часть, остаток по весам с шумом ±noise. Ни одна часть не превышает свой cap: излишек переливается в части с запасом
+        rng = rng or np.random.default_rng()
+        caps = np.asarray(caps, dtype=np.int64)
+        num_parts = len(caps)
+        if num_parts < 1:
+            raise ValueError("Количество частей должно быть >= 1")
+        if total_units < num_parts or caps.min() < 1:
+            raise ValueError("Недостаточная сумма для распределения по минимумам")
+        if caps.sum() < total_units:
+            raise ValueError(f"Аккаунты могут взять {caps.sum()} шагов, нужно {total_units}")
+
+        weights = 1 + rng.uniform(-noise, noise, num_parts)
+        parts = np.ones(num_parts, dtype=np.int64)
+        room = caps - parts
+        remaining = total_units - num_parts
+
+        while remaining > 0:
+            active = room > 0
+            active_weights = np.where(active, weights, 0)
+            shares = np.minimum(np.floor(remaining * active_weights / active_weights.sum()).astype(np.int64), room)
+            if shares.sum() == 0:
+                # Остаток меньше числа частей с запасом, раздаем по шагу случайным
+                candidates = np.flatnonzero(active)
+                shares[rng.choice(candidates, min(remaining, len(candidates)), replace=False)] = 1
+            parts += shares
+            room -= shares
+            remaining -= int(shares.sum())
+
+        return parts
+
+    def plan_cycle(self, total_amount: float, num_accounts: int, price: float, max_leverage: float, amount_step: float,
+                   noise: float = 0.15, rng=None) -> dict:
+        rng = rng or np.random.default_rng()
+        total_units = to_step_units(total_amount, amount_step)
+        units = self.max_units(price, max_leverage, amount_step)
+
+        long_ok = np.flatnonzero(self.healthy & (units >= total_units))
+        short_ok = self.healthy & (units >= 1)
+        if len(long_ok) == 0:
+            raise ValueError(f"Нет аккаунта, способного взять лонг {total_amount} при плече {max_leverage}")
+
+        long_index = rng.choice(long_ok)
+        short_ok[long_index] = False
+        short_candidates = np.flatnonzero(short_ok)
+        num_shorts = num_accounts - 1
+        if len(short_candidates) < num_shorts:
+            raise ValueError(f"Подходящих аккаунтов для шортов {len(short_candidates)}, нужно {num_shorts}")
+
+        shorts = rng.choice(short_candidates, num_shorts, replace=False)
+        if units[shorts].sum() < total_units:
+            # Случайная выборка не вытягивает объем — берем аккаунты с наибольшим запасом
+            shorts = short_candidates[np.argsort(-units[short_candidates], kind="stable")[:num_shorts]]
+
+        # Лонг — самый медленный из способных его взять, шорты по возрастанию латентности
+        selected = np.append(shorts, long_index)
+        long_capable = selected[units[selected] >= total_units]
+        long_index = long_capable[np.argmax(self.latency[long_capable])]
+        shorts = selected[selected != long_index]
+        shorts = shorts[np.argsort(self.latency[shorts], kind="stable")]
+
+        short_units = self.split_units(total_units, units[shorts], noise, rng)
+        return {
+            "long": self.wallets[long_index],
+            "short": list(self.wallets[shorts]),
+            "short_amounts": [from_step_units(int(part), amount_step) for part in short_units]
+        }
@@ -0,0 +1,48 @@
+import atexit
+import os
+import threading
+
+from utils.async_http import AsyncHttpClient, run_sync
+from utils.rate_limit import build_rate_limiter
+from utils.misc import load_json
+
+# Переопределяется для локального мок-сервера (benchmarks/mock_api.py)
+API_BASE_URL = os.environ.get("DERIVE_API_URL", "https://api.lyra.finance")
+
+DEFAULT_SETTINGS = {
+    "pool_connections": 4,
+    "pool_maxsize": 16,
+    "timeout_sec": 10,
+    "retries": 2,
+    "backoff_factor": 0.3,
+    "max_backoff_sec": 5,
+    "retry_budget_ratio": 0.2
+}
+
+
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def close_http_clients():
+    if _async_client is not None:
+        run_sync(_async_client.close())
+
+
+def get_async_http_client() -> AsyncHttpClient:
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                config = load_json("./config.json")
+                settings = {**DEFAULT_SETTINGS, **config.get("http_client", {})}
+                _async_client = AsyncHttpClient(**settings, rate_limiter=build_rate_limiter(config.get("rate_limit")))
+                atexit.register(close_http_clients)
+    return _async_client
+
+
+def set_async_http_client(async_client):
+    # Подмена транспорта целиком, например на бумажную биржу (utils/paper.py). Вызывать до первых запросов
+    global _async_client
+    with _client_lock:
+        _async_client = async_client
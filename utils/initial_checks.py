@@ -1,11 +1,24 @@
-import requests
+import time
+import asyncio
+import contextlib
 
-from utils.state import get_account_info
+import aiohttp
+import numpy as np
+
+from utils.state import refresh_accounts_info, save_accounts_state
 from utils.initial_data_extract import extract_data
 from utils.tokens import update_tokens_info
 from utils.misc import load_json
+from utils.async_http import run_sync
+from utils.http_client import get_async_http_client
+from utils.state_store import get_state_store
+from utils.fleet import FleetModel
 from utils.logger import logger
 
+DEFAULT_STARTUP_SETTINGS = {
+    "max_workers": 16
+}
+
 
 def validate_pair_probability(pair_probability: dict):
     if not isinstance(pair_probability, dict):
@@ -21,16 +34,17 @@ def validate_pair_probability(pair_probability: dict):
         raise ValueError("Сумма значений в 'pair_probability' должна быть равна 1.")
 
 
-def validate_numeric_ranges(config: dict):
-    numeric_ranges = [
-        ("net_order_value_usd", 0, float('inf')),
-        ("leverage", 1, float('inf')),
-        ("num_of_accounts_per_trade", 1, float('inf')),
-        ("delay_open_close_minutes", 0, float('inf')),
-        ("delay_between_opening_new_position_minutes", 0, float('inf')),
-        ("delay_between_opening_hedge_position_sec", 0, float('inf')),
-    ]
+DEFAULT_NUMERIC_RANGES = [
+    ("net_order_value_usd", 0, float('inf')),
+    ("leverage", 1, float('inf')),
+    ("num_of_accounts_per_trade", 1, float('inf')),
+    ("delay_open_close_minutes", 0, float('inf')),
+    ("delay_between_opening_new_position_minutes", 0, float('inf')),
+    ("delay_between_opening_hedge_position_sec", 0, float('inf')),
+]
+
 
+def validate_numeric_ranges(config: dict, numeric_ranges: list = DEFAULT_NUMERIC_RANGES):
     for key, min_value, max_value in numeric_ranges:
         value = config.get(key, {})
         if not isinstance(value, dict):
@@ -48,18 +62,294 @@ def validate_numeric_ranges(config: dict):
 
 
 def validate_tokens(config):
+    # Наличие {TOKEN}-PERP на бирже проверяет update_tokens_info, здесь только формат тикера
     tokens = [x for x in config.get('pair_probability', [])]
     for token in tokens:
-        if token not in ['ETH', 'BTC']:
-            raise ValueError(f"Токен {token} не поддерживается, не тестировал его")
+        if not isinstance(token, str) or not token.isalnum() or token != token.upper():
+            raise ValueError(f"Токен {token} должен быть тикером в верхнем регистре, например ETH")
 
 
-def check_config():
-    config = load_json("./config.json")
+def validate_hedge_execution(config: dict):
+    hedge_execution = config.get("hedge_execution", {})
+    if not isinstance(hedge_execution, dict):
+        raise ValueError("'hedge_execution' должно быть словарем.")
+
+    if hedge_execution.get("mode", "sequential") not in ["sequential", "concurrent"]:
+        raise ValueError("'hedge_execution.mode' должно быть 'sequential' или 'concurrent'.")
+
+    max_workers = hedge_execution.get("max_workers")
+    if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+        raise ValueError("'hedge_execution.max_workers' должно быть целым числом >= 1.")
+
+
+def validate_http_client(config: dict):
+    http_client = config.get("http_client", {})
+    if not isinstance(http_client, dict):
+        raise ValueError("'http_client' должно быть словарем.")
+
+    for key in ["pool_connections", "pool_maxsize", "timeout_sec", "retries", "backoff_factor", "max_backoff_sec", "retry_budget_ratio"]:
+        value = http_client.get(key)
+        if value is not None and (not isinstance(value, (int, float)) or value < 0):
+            raise ValueError(f"'http_client.{key}' должно быть неотрицательным числом.")
+
+
+def validate_rate_limit(config: dict):
+    rate_limit = config.get("rate_limit", {})
+    if not isinstance(rate_limit, dict):
+        raise ValueError("'rate_limit' должно быть словарем.")
+
+    if not isinstance(rate_limit.get("enabled", True), bool):
+        raise ValueError("'rate_limit.enabled' должно быть true или false.")
+
+    buckets = {f"endpoints.{name}": bucket for name, bucket in rate_limit.get("endpoints", {}).items()}
+    if "per_wallet" in rate_limit:
+        buckets["per_wallet"] = rate_limit["per_wallet"]
+
+    for name, bucket in buckets.items():
+        if not isinstance(bucket, dict):
+            raise ValueError(f"'rate_limit.{name}' должно быть словарем.")
+        for key in ["rate_per_sec", "burst"]:
+            value = bucket.get(key)
+            if not isinstance(value, (int, float)) or value <= 0:
+                raise ValueError(f"'rate_limit.{name}.{key}' должно быть положительным числом.")
+
+
+def validate_state_refresh(config: dict):
+    state_refresh = config.get("state_refresh", {})
+    if not isinstance(state_refresh, dict):
+        raise ValueError("'state_refresh' должно быть словарем.")
+
+    max_workers = state_refresh.get("max_workers")
+    if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+        raise ValueError("'state_refresh.max_workers' должно быть целым числом >= 1.")
+
+    if "min_interval_per_proxy_sec" in state_refresh:
+        validate_numeric_ranges(
+            {"min_interval_per_proxy_sec": state_refresh["min_interval_per_proxy_sec"]},
+            [("min_interval_per_proxy_sec", 0, float('inf'))]
+        )
+
+
+def validate_market_data(config: dict):
+    market_data = config.get("market_data", {})
+    if not isinstance(market_data, dict):
+        raise ValueError("'market_data' должно быть словарем.")
+
+    if not isinstance(market_data.get("enabled", False), bool):
+        raise ValueError("'market_data.enabled' должно быть true или false.")
+
+    for key in ["interval_ms", "max_age_sec", "reconnect_delay_sec"]:
+        value = market_data.get(key)
+        if value is not None and (not isinstance(value, (int, float)) or value <= 0):
+            raise ValueError(f"'market_data.{key}' должно быть положительным числом.")
+
+
+def validate_scheduler(config: dict):
+    scheduler = config.get("scheduler", {})
+    if not isinstance(scheduler, dict):
+        raise ValueError("'scheduler' должно быть словарем.")
+
+    workers = scheduler.get("workers", 1)
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError("'scheduler.workers' должно быть целым числом >= 1.")
+
+    lease_poll_sec = scheduler.get("lease_poll_sec", 1)
+    if not isinstance(lease_poll_sec, (int, float)) or lease_poll_sec <= 0:
+        raise ValueError("'scheduler.lease_poll_sec' должно быть положительным числом.")
+
+
+def validate_emergency_close(config: dict):
+    emergency_close = config.get("emergency_close", {})
+    if not isinstance(emergency_close, dict):
+        raise ValueError("'emergency_close' должно быть словарем.")
+
+    if emergency_close.get("mode", "sequential") not in ["sequential", "parallel"]:
+        raise ValueError("'emergency_close.mode' должно быть 'sequential' или 'parallel'.")
+
+    for key in ["max_workers", "max_rounds"]:
+        value = emergency_close.get(key)
+        if value is not None and (not isinstance(value, int) or value < 1):
+            raise ValueError(f"'emergency_close.{key}' должно быть целым числом >= 1.")
+
+    poll_delay_sec = emergency_close.get("poll_delay_sec")
+    if poll_delay_sec is not None and (not isinstance(poll_delay_sec, (int, float)) or poll_delay_sec < 0):
+        raise ValueError("'emergency_close.poll_delay_sec' должно быть неотрицательным числом.")
+
+
+def validate_startup(config: dict):
+    startup = config.get("startup", {})
+    if not isinstance(startup, dict):
+        raise ValueError("'startup' должно быть словарем.")
+
+    max_workers = startup.get("max_workers")
+    if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+        raise ValueError("'startup.max_workers' должно быть целым числом >= 1.")
+
+
+def validate_proxy_health(config: dict):
+    proxy_health = config.get("proxy_health", {})
+    if not isinstance(proxy_health, dict):
+        raise ValueError("'proxy_health' должно быть словарем.")
+
+    if not isinstance(proxy_health.get("enabled", False), bool):
+        raise ValueError("'proxy_health.enabled' должно быть true или false.")
+
+    for key in ["window", "min_samples"]:
+        value = proxy_health.get(key)
+        if value is not None and (not isinstance(value, int) or value < 1):
+            raise ValueError(f"'proxy_health.{key}' должно быть целым числом >= 1.")
+
+    max_error_rate = proxy_health.get("max_error_rate")
+    if max_error_rate is not None and (not isinstance(max_error_rate, (int, float)) or not 0 <= max_error_rate <= 1):
+        raise ValueError("'proxy_health.max_error_rate' должно быть числом от 0 до 1.")
+
+    for key in ["max_latency_p90_sec", "probe_timeout_sec"]:
+        value = proxy_health.get(key)
+        if value is not None and (not isinstance(value, (int, float)) or value <= 0):
+            raise ValueError(f"'proxy_health.{key}' должно быть положительным числом.")
+
+    probe_interval_sec = proxy_health.get("probe_interval_sec")
+    if probe_interval_sec is not None and (not isinstance(probe_interval_sec, (int, float)) or probe_interval_sec < 0):
+        raise ValueError("'proxy_health.probe_interval_sec' должно быть неотрицательным числом.")
+
+
+def validate_journal(config: dict):
+    journal = config.get("journal", {})
+    if not isinstance(journal, dict):
+        raise ValueError("'journal' должно быть словарем.")
+
+    if not isinstance(journal.get("enabled", True), bool):
+        raise ValueError("'journal.enabled' должно быть true или false.")
+
+    if not isinstance(journal.get("path", "./data/journal.bin"), str):
+        raise ValueError("'journal.path' должно быть строкой.")
+
+
+def validate_cycle_wal(config: dict):
+    cycle_wal = config.get("cycle_wal", {})
+    if not isinstance(cycle_wal, dict):
+        raise ValueError("'cycle_wal' должно быть словарем.")
+
+    if not isinstance(cycle_wal.get("enabled", True), bool):
+        raise ValueError("'cycle_wal.enabled' должно быть true или false.")
+
+    if not isinstance(cycle_wal.get("path", "./data/cycles.wal"), str):
+        raise ValueError("'cycle_wal.path' должно быть строкой.")
+
+
+def validate_logging(config: dict):
+    logging = config.get("logging", {})
+    if not isinstance(logging, dict):
+        raise ValueError("'logging' должно быть словарем.")
+
+    for key in ["enqueue", "serialize"]:
+        if not isinstance(logging.get(key, False), bool):
+            raise ValueError(f"'logging.{key}' должно быть true или false.")
+
+    order_path = logging.get("order_path", {})
+    if not isinstance(order_path, dict):
+        raise ValueError("'logging.order_path' должно быть словарем.")
+
+    levels = ["TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL"]
+    for key, value in [("stdout_level", logging.get("stdout_level", "DEBUG")), ("file_level", logging.get("file_level", "INFO")),
+                       ("order_path.level", order_path.get("level", "INFO"))]:
+        if value not in levels:
+            raise ValueError(f"'logging.{key}' должно быть одним из: {', '.join(levels)}.")
+
+    sample_rate = order_path.get("sample_rate", 1.0)
+    if not isinstance(sample_rate, (int, float)) or not 0 < sample_rate <= 1:
+        raise ValueError("'logging.order_path.sample_rate' должно быть в диапазоне (0, 1].")
+
+
+def validate_split_noise(config: dict):
+    split_noise = config.get("split_noise", 0.15)
+    if not isinstance(split_noise, (int, float)) or not 0 <= split_noise < 1:
+        raise ValueError("'split_noise' должно быть в диапазоне [0, 1).")
+
+
+def validate_paper(config: dict):
+    paper = config.get("paper", {})
+    if not isinstance(paper, dict):
+        raise ValueError("'paper' должно быть словарем.")
+
+    for key in ["speed", "initial_balance_usd", "fee_rate", "slippage_bps", "latency_ms", "jitter_ms"]:
+        value = paper.get(key, 0)
+        if not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"'paper.{key}' должно быть неотрицательным числом.")
+
+    for key in ["reject_rate", "partial_fill_rate"]:
+        value = paper.get(key, 0)
+        if not isinstance(value, (int, float)) or not 0 <= value <= 1:
+            raise ValueError(f"'paper.{key}' должно быть в диапазоне [0, 1].")
+
+    max_cycles = paper.get("max_cycles", 100)
+    if not isinstance(max_cycles, int) or max_cycles < 1:
+        raise ValueError("'paper.max_cycles' должно быть целым числом >= 1.")
+
+    if paper.get("seed") is not None and not isinstance(paper.get("seed"), int):
+        raise ValueError("'paper.seed' должно быть целым числом или null.")
+
+    if not isinstance(paper.get("sign_orders", True), bool):
+        raise ValueError("'paper.sign_orders' должно быть true или false.")
+
+
+def validate_portfolio(config: dict):
+    portfolio = config.get("portfolio", {})
+    if not isinstance(portfolio, dict):
+        raise ValueError("'portfolio' должно быть словарем.")
+
+    if not isinstance(portfolio.get("enabled", False), bool):
+        raise ValueError("'portfolio.enabled' должно быть true или false.")
+    if not portfolio.get("enabled", False):
+        return
+
+    instruments = portfolio.get("instruments")
+    if not isinstance(instruments, dict) or not instruments:
+        raise ValueError("'portfolio.instruments' должно быть непустым словарем.")
+
+    total_share = 0
+    for token, settings in instruments.items():
+        if token not in config.get("pair_probability", {}):
+            raise ValueError(f"Инструмент портфеля {token} должен быть указан в 'pair_probability'.")
+        if not isinstance(settings, dict):
+            raise ValueError(f"'portfolio.instruments.{token}' должно быть словарем.")
+
+        workers = settings.get("workers", 1)
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError(f"'portfolio.instruments.{token}.workers' должно быть целым числом >= 1.")
+
+        share = settings.get("accounts_share")
+        if not isinstance(share, (int, float)) or share <= 0:
+            raise ValueError(f"'portfolio.instruments.{token}.accounts_share' должно быть положительным числом.")
+        total_share += share
+
+    if total_share > 1 + 1e-9:
+        raise ValueError("Сумма 'accounts_share' по инструментам портфеля не может быть больше 1.")
+
+
+def check_config(config_path: str = "./config.json", paper: bool = False):
+    # paper=True — для бумажной торговли: те же проверки плюс секция paper, которую боевой запуск не читает
+    config = load_json(config_path)
 
     validate_pair_probability(config.get("pair_probability", {}))
     validate_numeric_ranges(config)
     validate_tokens(config)
+    validate_hedge_execution(config)
+    validate_http_client(config)
+    validate_rate_limit(config)
+    validate_state_refresh(config)
+    validate_market_data(config)
+    validate_scheduler(config)
+    validate_emergency_close(config)
+    validate_startup(config)
+    validate_proxy_health(config)
+    validate_journal(config)
+    validate_cycle_wal(config)
+    validate_portfolio(config)
+    validate_logging(config)
+    validate_split_noise(config)
+    if paper:
+        validate_paper(config)
 
     logger.success("✅ config.json")
 
@@ -69,13 +359,29 @@ def parse_creds(file_path: str) -> list:
         return [line.split(':') for line in file.read().splitlines() if line]
 
 
-def validate_proxy(proxy: dict):
+async def validate_proxy_async(proxy: dict):
     try:
-        response = requests.get("https://example.com/", proxies=proxy, timeout=5)
-        if response.status_code != 200:
-            raise ValueError(f"Неверный статус код с прокси {response.status_code}: {proxy['http']}")
-    except requests.RequestException:
+        response = await get_async_http_client().get("https://example.com/", proxy=proxy, timeout=5)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
         raise ValueError(f"Нерабочие прокси: {proxy['http']}")
+    if response.status_code != 200:
+        raise ValueError(f"Неверный статус код с прокси {response.status_code}: {proxy['http']}")
+
+
+def validate_proxy(proxy: dict):
+    run_sync(validate_proxy_async(proxy))
+
+
+async def validate_proxies_async(proxies: list, max_workers: int):
+    # Один прокси может быть у нескольких аккаунтов, проверяем его один раз
+    unique_proxies = list({proxy['http']: proxy for proxy in proxies}.values())
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def validate(proxy):
+        async with semaphore:
+            await validate_proxy_async(proxy)
+
+    await asyncio.gather(*(validate(proxy) for proxy in unique_proxies))
 
 
 def check_creds():
@@ -84,17 +390,19 @@ def check_creds():
     if (len(creds) < 2):
         raise ValueError("Не может быть одного аккаунта, минимум 2. Исправьте creds.txt")
 
+    proxies = []
     for cred in creds:
         if len(cred) != 7:
             raise ValueError(f"Строка '{':'.join(cred)}' неправильная.")
 
-        proxy = {
+        proxies.append({
             'http': f'http://{cred[5]}:{cred[6]}@{cred[3]}:{cred[4]}',
             'https': f'http://{cred[5]}:{cred[6]}@{cred[3]}:{cred[4]}'
-        }
-        validate_proxy(proxy)
+        })
 
     config = load_json("./config.json")
+    settings = {**DEFAULT_STARTUP_SETTINGS, **config.get("startup", {})}
+    run_sync(validate_proxies_async(proxies, settings['max_workers']))
 
     if config['num_of_accounts_per_trade']['max'] > len(creds):
         raise ValueError(
@@ -130,35 +438,62 @@ def check_balance(from_api: bool):
     max_leverage = config['leverage']['max']
     max_nominal_value = calculate_max_nominal_value(config)
 
-    for data in data_list:
+    if from_api:
+        # Балансы запрашиваются параллельно и сразу сохраняются в state, повторный запрос при старте не нужен
         try:
-            if (from_api):
-                account_info = get_account_info(data)
-            else:
-                current_state = load_json("./data/state.json")
-                matching_account = next(
-                    (item for item in current_state if item['derive_wallet'] == data['derive_wallet']), 
-                    None
-                )
-                if matching_account:
-                    account_info = matching_account
-                else:
-                    raise ValueError(f"Не удалось найти совпадение для derive_wallet в ./data/state.json: {data['derive_wallet']}")
-        except Exception:
-            raise ValueError(f"Неправильные данные от аккаунта для: {data}")
-
-        validate_account_balance(account_info, data['derive_wallet'], max_nominal_value, max_leverage)
+            account_infos = refresh_accounts_info(data_list)
+        except Exception as e:
+            raise ValueError(f"Неправильные данные от аккаунтов: {e}")
+        save_accounts_state(data_list, account_infos, {data['derive_wallet'] for data in data_list})
+    else:
+        state_store = get_state_store()
+        account_infos = []
+        for data in data_list:
+            account_info = state_store.get(data['derive_wallet'])
+            if not account_info:
+                raise ValueError(f"Не удалось найти совпадение для derive_wallet в ./data/state.json: {data['derive_wallet']}")
+            account_infos.append(account_info)
+
+    fleet = FleetModel([data['derive_wallet'] for data in data_list], [float(info['subaccount_value']) for info in account_infos])
+    logger.info(
+        f"Балансы {len(data_list)} аккаунтов: мин. {fleet.balances.min():.3f}$, "
+        f"медиана {float(np.median(fleet.balances)):.3f}$, макс. {fleet.balances.max():.3f}$"
+    )
+
+    violations = fleet.leverage_violations(max_nominal_value, max_leverage)
+    if len(violations):
+        index = violations[0]
+        validate_account_balance(account_infos[index], data_list[index]['derive_wallet'], max_nominal_value, max_leverage)
+
+
+@contextlib.contextmanager
+def timed_phase(timings: dict, name: str):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - started_at
 
 
 def start_checks():
-    logger.info("Проверка config.json")
-    check_config()
-    logger.info("Проверка creds.txt и прокси")
-    check_creds()
-    logger.info("Проверка данных от аккаунтов и баланса")
-    check_balance(from_api=True)
-    logger.success("✅ Данные от аккаунтов в creds.txt правильные")
-    logger.info("Обновление данных о выбранных токенах")
-    update_tokens_info()
-    logger.success("✅ Данные о выбранных токенах обновлены")
+    timings = {}
+    try:
+        with timed_phase(timings, "config"):
+            logger.info("Проверка config.json")
+            check_config()
+        with timed_phase(timings, "creds и прокси"):
+            logger.info("Проверка creds.txt и прокси")
+            check_creds()
+        with timed_phase(timings, "балансы"):
+            logger.info("Проверка данных от аккаунтов и баланса")
+            check_balance(from_api=True)
+            logger.success("✅ Данные от аккаунтов в creds.txt правильные")
+        with timed_phase(timings, "токены"):
+            logger.info("Обновление данных о выбранных токенах")
+            update_tokens_info()
+            logger.success("✅ Данные о выбранных токенах обновлены")
+    finally:
+        summary = ", ".join(f"{name}: {seconds:.2f} c" for name, seconds in timings.items())
+        logger.info(f"Время проверок при запуске: {summary} (всего {sum(timings.values()):.2f} c)")
+
     logger.success("✅ Все проверки пройдены")
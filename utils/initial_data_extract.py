@@ -1,6 +1,10 @@
+from utils.misc import get_signer
+
+CREDS_PATH = './creds.txt'
+
 
 def extract_data() -> dict:
-    with open('./creds.txt', 'r', encoding='utf-8') as file:
+    with open(CREDS_PATH, 'r', encoding='utf-8') as file:
         raw_data = file.read()
     
     result = []
@@ -19,6 +23,7 @@ def extract_data() -> dict:
             'derive_wallet': splitted_data[0],
             'subacc_id': int(splitted_data[1]),
             'session_pk': splitted_data[2],
+            'signer': get_signer(splitted_data[2]),
             'proxy': proxy
         })
     
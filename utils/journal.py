@@ -0,0 +1,272 @@
+import argparse
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from utils.misc import load_json
+from utils.orders import OrderFill
+from utils.clock import get_clock
+
+JOURNAL_PATH = "./data/journal.bin"
+MAGIC = b"DRVJRNL1"
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "path": JOURNAL_PATH
+}
+
+# Одна нога = одна запись фиксированного размера, файл читается через np.memmap без парсинга
+RECORD_DTYPE = np.dtype([
+    ("ts", "<f8"),
+    ("cycle_id", "S12"),
+    ("wallet", "S42"),
+    ("wallet_key", "<u8"),
+    ("instrument", "S16"),
+    ("side", "i1"),
+    ("reduce_only", "u1"),
+    ("rejected", "u1"),
+    ("requested", "<f8"),
+    ("filled", "<f8"),
+    ("price", "<f8"),
+    ("fee", "<f8"),
+    ("latency_ms", "<f4")
+])
+HEADER_SIZE = len(MAGIC)
+
+GROUP_KEYS = {
+    "account": "wallet_key",
+    "instrument": "instrument",
+    "day": "day"
+}
+
+
+def wallet_key(wallet: str) -> int:
+    # Первые 64 бита адреса: адреса — хэши, коллизии на флоте из тысяч кошельков практически невозможны,
+    # а группировка по uint64 на порядок быстрее, чем по строкам
+    return int(wallet[2:18] or "0", 16)
+
+
+class TradeJournal:
+    # Торговый поток только кладет ногу в очередь. Упаковка в запись и write() идут в потоке journal-writer
+    # в заранее открытый файл, между ногами хеджа нет дискового I/O
+    def __init__(self, path: str = JOURNAL_PATH):
+        self.path = path
+        self._file = None
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _open_for_append(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file = open(self.path, "ab")
+        if file.tell() == 0:
+            file.write(MAGIC)
+        return file
+
+    @staticmethod
+    def _pack(fill: OrderFill, cycle_id: str, reduce_only: bool, ts: float) -> bytes:
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record[0] = (
+            ts,
+            cycle_id.encode(),
+            fill.derive_wallet.encode(),
+            wallet_key(fill.derive_wallet),
+            fill.instrument_name.encode(),
+            1 if fill.direction == "buy" else -1,
+            reduce_only,
+            bool(fill.error),
+            fill.requested_amount,
+            fill.filled_amount,
+            fill.average_price,
+            fill.fee,
+            fill.latency_ms
+        )
+        return record.tobytes()
+
+    def append(self, fill: OrderFill, cycle_id: str = "", reduce_only: bool = False, ts: float = None):
+        # В бумажной торговле время виртуальное, группировка по дням идет по времени симуляции.
+        # Время берется в момент вызова, а не записи
+        self._queue.put((fill, cycle_id, reduce_only, get_clock().time() if ts is None else ts))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            try:
+                if self._file is None:
+                    self._file = self._open_for_append()
+                # Одна запись — один write() в O_APPEND, недописанным может остаться только хвост
+                self._file.write(self._pack(*item))
+                self._file.flush()
+            except Exception as e:
+                print(f"Ошибка записи в журнал {self.path}: {e}", file=sys.stderr)
+
+    def flush(self, timeout: float = 5):
+        # Дождаться записи всего, что уже поставлено в очередь
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read(self) -> np.ndarray:
+        if self._thread.is_alive():
+            self.flush()
+        if not os.path.exists(self.path) or os.path.getsize(self.path) <= HEADER_SIZE:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+
+        with open(self.path, "rb") as file:
+            if file.read(HEADER_SIZE) != MAGIC:
+                raise ValueError(f"{self.path} не является журналом сделок")
+
+        # Недописанная последняя запись (падение посреди write) отбрасывается
+        count = (os.path.getsize(self.path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+_journal = None
+_journal_configured = False
+_journal_lock = threading.Lock()
+
+
+def get_journal() -> TradeJournal:
+    # None, если журнал выключен в config.json. Путь относительный, как и остальные файлы в data/
+    global _journal, _journal_configured
+    if not _journal_configured:
+        with _journal_lock:
+            if not _journal_configured:
+                settings = {**DEFAULT_SETTINGS, **load_json("./config.json").get("journal", {})}
+                _journal = TradeJournal(settings['path']) if settings['enabled'] else None
+                _journal_configured = True
+    return _journal
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+def factorize(keys: np.ndarray) -> tuple:
+    # Плотный диапазон целых (дни) — за O(n) через bincount, остальное через сортировку
+    if keys.dtype.kind == "i" and keys.max() - keys.min() < 1 << 20:
+        offsets = keys - keys.min()
+        present = np.bincount(offsets) > 0
+        return np.flatnonzero(present) + keys.min(), (np.cumsum(present) - 1)[offsets]
+    return np.unique(keys, return_inverse=True)
+
+
+def aggregate(records: np.ndarray, by: str) -> list:
+    if len(records) == 0:
+        return []
+
+    if by == "day":
+        keys = (records['ts'] // 86400).astype(np.int64)
+    else:
+        keys = np.asarray(records[GROUP_KEYS[by]])
+    groups, inverse = factorize(keys)
+
+    notional = records['filled'] * records['price']
+    # Денежный поток: продажи в плюс, покупки в минус. Для закрытых позиций это реализованный PnL
+    cash_flow = -records['side'] * notional
+    fees = records['fee']
+
+    def total(values):
+        return np.bincount(inverse, weights=values, minlength=len(groups))
+
+    volume = total(notional)
+    fee_sum = total(fees)
+    pnl = total(cash_flow) - fee_sum
+    orders = np.bincount(inverse, minlength=len(groups))
+    rejected = total(records['rejected'].astype(np.float64))
+
+    # Перцентили латентности по группам: одна сортировка по (группа, латентность) и индексы внутри сегментов
+    latency = records['latency_ms'].astype(np.float64)
+    order = np.argsort(inverse * (latency.max() + 1) + latency)
+    sorted_latency = latency[order]
+    starts = np.concatenate(([0], np.cumsum(orders)[:-1]))
+    p50 = sorted_latency[starts + orders * 50 // 100]
+    p99 = sorted_latency[starts + np.minimum(orders - 1, orders * 99 // 100)]
+
+    if by == "day":
+        labels = [_day(group * 86400) for group in groups]
+    elif by == "account":
+        # Для подписи группы берем адрес из первой записи группы
+        first = np.empty(len(groups), dtype=np.int64)
+        first[inverse[::-1]] = np.arange(len(inverse))[::-1]
+        labels = [wallet.decode() for wallet in records['wallet'][first]]
+    else:
+        labels = [group.decode() for group in groups]
+
+    rows = []
+    for i, label in enumerate(labels):
+        rows.append({
+            by: label,
+            "orders": int(orders[i]),
+            "rejected": int(rejected[i]),
+            "volume_usd": float(volume[i]),
+            "fees_usd": float(fee_sum[i]),
+            "pnl_usd": float(pnl[i]),
+            "latency_p50_ms": float(p50[i]),
+            "latency_p99_ms": float(p99[i])
+        })
+    return rows
+
+
+def query(records: np.ndarray, by: str, since: str = None, until: str = None, account: str = None, instrument: str = None) -> list:
+    mask = np.ones(len(records), dtype=bool)
+    if since:
+        mask &= records['ts'] >= datetime.strptime(since, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+    if until:
+        mask &= records['ts'] < datetime.strptime(until, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() + 86400
+    if account:
+        mask &= records['wallet_key'] == wallet_key(account)
+    if instrument:
+        mask &= records['instrument'] == instrument.encode()
+    return aggregate(records if mask.all() else records[mask], by)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Агрегаты по журналу сделок")
+    parser.add_argument("--by", choices=list(GROUP_KEYS), default="account")
+    parser.add_argument("--since", help="YYYY-MM-DD, включительно")
+    parser.add_argument("--until", help="YYYY-MM-DD, включительно")
+    parser.add_argument("--account")
+    parser.add_argument("--instrument")
+    parser.add_argument("--path", default=JOURNAL_PATH)
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    records = TradeJournal(args.path).read()
+    rows = query(records, args.by, args.since, args.until, args.account, args.instrument)
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+
+    print(f"{args.by:>42} {'orders':>7} {'rejected':>8} {'volume, $':>14} {'fees, $':>10} {'pnl, $':>12} {'p50, ms':>8} {'p99, ms':>8}")
+    for x in rows:
+        print(
+            f"{x[args.by]:>42} {x['orders']:>7} {x['rejected']:>8} {x['volume_usd']:>14.2f} {x['fees_usd']:>10.4f} "
+            f"{x['pnl_usd']:>12.4f} {x['latency_p50_ms']:>8.1f} {x['latency_p99_ms']:>8.1f}"
+        )
+    print(f"Записей: {len(records)}, запрос выполнен за {elapsed_ms:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,91 @@
 from loguru import logger
+import atexit
+import queue
+import random
+import threading
 import sys
 import os
 
+from utils.misc.load_json import load_json
+
 LOG_FILE = os.path.join(os.path.dirname(__file__), '..', 'logs', 'app.log')
+CONFIG_PATH = "./config.json"
+
+DEFAULT_SETTINGS = {
+    # Все синки пишут через очередь: форматирование и запись на диск идут в потоке log-writer, а не в торговом
+    "enqueue": True,
+    "stdout_level": "DEBUG",
+    "file_level": "INFO",
+    # JSON-строки с полями account, leg, instrument, latency_ms в extra вместо текстового формата
+    "serialize": False,
+    "order_path": {
+        "level": "INFO",
+        "sample_rate": 1.0
+    }
+}
+
+
+def load_settings() -> dict:
+    # Логгер настраивается при импорте, config.json может еще не быть (бенчмарки, первый запуск)
+    try:
+        settings = load_json(CONFIG_PATH).get("logging", {})
+    except (OSError, ValueError):
+        settings = {}
+    return {**DEFAULT_SETTINGS, **settings, "order_path": {**DEFAULT_SETTINGS['order_path'], **settings.get("order_path", {})}}
+
+
+class LogQueue:
+    # Торговый поток только кладет готовую запись в очередь. Поток log-writer переиздает ее в настоящие синки,
+    # подменяя через patch время, место вызова, поток и extra на исходные.
+    # enqueue=True из loguru не подходит: он пиклит запись в multiprocessing-очередь, это дольше синхронной записи
+    RESTORED_FIELDS = ("time", "elapsed", "name", "module", "file", "function", "line", "thread", "process", "exception")
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def is_writer(self, record) -> bool:
+        # Фильтры loguru вызываются в потоке, который логирует
+        return threading.current_thread() is self._thread
+
+    def is_producer(self, record) -> bool:
+        return threading.current_thread() is not self._thread
+
+    def put(self, message):
+        self._queue.put(message.record)
+
+    def _emit(self, record: dict):
+        def restore(new_record):
+            new_record.update({key: record[key] for key in self.RESTORED_FIELDS})
+            new_record['extra'].update(record['extra'])
+
+        message = record['message']
+        if record['extra'].get('order_path'):
+            # order_event кладет в очередь шаблон без подстановки, поля подставляются здесь
+            message = message.format(**record['extra'])
+        logger.patch(restore).log(record['level'].name, message)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            try:
+                self._emit(record)
+            except Exception as e:
+                print(f"Ошибка записи лога: {e}", file=sys.stderr)
+
+    def close(self):
+        # При выходе дописываем все, что осталось в очереди
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+settings = load_settings()
+log_queue = LogQueue() if settings['enqueue'] else None
+sink_filter = log_queue.is_writer if log_queue else None
 
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
@@ -15,17 +98,46 @@ logger.add(
            "<level>{level: <8}</level> | "
            "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
            "<level>{message}</level>",
-    level="DEBUG",
+    level=settings['stdout_level'],
     colorize=True,
-    enqueue=True
+    filter=sink_filter
 )
 
 logger.add(
     LOG_FILE,
     rotation="100 MB",
     retention="30 days",
-    level="INFO",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+    level=settings['file_level'],
+    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
+    serialize=settings['serialize'],
+    filter=sink_filter
 )
 
+if log_queue:
+    min_level = min(logger.level(settings['stdout_level']).no, logger.level(settings['file_level']).no)
+    logger.add(log_queue.put, level=min_level, format="{message}", filter=log_queue.is_producer)
+
+_order_path_level = logger.level(settings['order_path']['level']).no
+_order_path_sample_rate = settings['order_path']['sample_rate']
+_warning_level = logger.level("WARNING").no
+# Свой генератор: общий random засевают TradeManager и бумажная торговля, сэмплинг логов не должен сдвигать их последовательность
+_sample_rng = random.Random()
+
+
+def order_event(level: str, message: str, **fields):
+    # Лог с пути отправки ордеров: поля уходят в extra, а лишние записи отсекаются по уровню и сэмплингу
+    # до форматирования. Предупреждения и ошибки не сэмплируются
+    level_no = logger.level(level).no
+    if level_no < _warning_level:
+        if level_no < _order_path_level:
+            return
+        if _order_path_sample_rate < 1 and _sample_rng.random() >= _order_path_sample_rate:
+            return
+    if log_queue:
+        # Без аргументов loguru не вызывает str.format: шаблон подставит поток log-writer
+        logger.opt(depth=1).bind(order_path=True, **fields).log(level, message)
+    else:
+        logger.opt(depth=1).log(level, message, order_path=True, **fields)
+
+
 logger.info("Logger initialized and configured.")
@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+
+import websocket
+
+from utils.trade import get_instrument_ticker
+from utils.logger import logger
+
+WS_ENDPOINT = "wss://api.lyra.finance/ws"
+
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "ws_url": WS_ENDPOINT,
+    "interval_ms": 100,
+    "max_age_sec": 5,
+    "reconnect_delay_sec": 1
+}
+
+
+def instrument_name_for(token: str) -> str:
+    return f"{token.upper()}-PERP"
+
+
+class TickerCache:
+    def __init__(self):
+        self._tickers = {}
+        self._updated_at = {}
+        self._lock = threading.Lock()
+
+    def set(self, instrument_name: str, ticker: dict):
+        with self._lock:
+            # Сливаем с прошлым снапшотом: в стриме могут прийти не все поля из REST get_ticker
+            self._tickers[instrument_name] = {**self._tickers.get(instrument_name, {}), **ticker}
+            self._updated_at[instrument_name] = time.monotonic()
+
+    def age(self, instrument_name: str) -> float:
+        with self._lock:
+            updated_at = self._updated_at.get(instrument_name)
+        return float('inf') if updated_at is None else time.monotonic() - updated_at
+
+    def get(self, instrument_name: str, max_age_sec: float = None) -> dict:
+        with self._lock:
+            ticker = self._tickers.get(instrument_name)
+            updated_at = self._updated_at.get(instrument_name)
+        if ticker is None:
+            return None
+        if max_age_sec is not None and time.monotonic() - updated_at > max_age_sec:
+            return None
+        return dict(ticker)
+
+
+class MarketDataStream:
+    def __init__(self, instruments: list, cache: TickerCache, ws_url: str = WS_ENDPOINT, interval_ms: int = 100, reconnect_delay_sec: float = 1):
+        self.instruments = instruments
+        self.cache = cache
+        self.ws_url = ws_url
+        self.interval_ms = interval_ms
+        self.reconnect_delay_sec = reconnect_delay_sec
+
+        self._ws = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def _channels(self) -> list:
+        return [f"ticker.{instrument}.{self.interval_ms}" for instrument in self.instruments]
+
+    def _on_open(self, ws):
+        ws.send(json.dumps({
+            "method": "subscribe",
+            "params": {"channels": self._channels()},
+            "id": 1
+        }))
+        logger.info(f"Подписка на тикеры {self.instruments} через websocket")
+
+    def _on_message(self, ws, message: str):
+        message = json.loads(message)
+        if message.get('method') != "subscription":
+            return
+
+        data = message['params']['data']
+        ticker = data.get('instrument_ticker', data)
+        instrument_name = ticker.get('instrument_name') or message['params']['channel'].split('.')[1]
+        self.cache.set(instrument_name, ticker)
+
+    def _on_error(self, ws, error):
+        logger.warning(f"Ошибка websocket тикеров: {error}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._ws = websocket.WebSocketApp(
+                self.ws_url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error
+            )
+            self._ws.run_forever(ping_interval=20, ping_timeout=10)
+            if not self._stopped.is_set():
+                time.sleep(self.reconnect_delay_sec)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="market-data", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._ws:
+            self._ws.close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+class MarketData:
+    def __init__(self, tokens: list, settings: dict = None):
+        self.settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        self.cache = TickerCache()
+        self.stream = None
+
+        if self.settings['enabled']:
+            self.stream = MarketDataStream(
+                [instrument_name_for(token) for token in tokens],
+                self.cache,
+                ws_url=self.settings['ws_url'],
+                interval_ms=self.settings['interval_ms'],
+                reconnect_delay_sec=self.settings['reconnect_delay_sec']
+            )
+            self.stream.start()
+
+    def get_ticker(self, token: str) -> dict:
+        instrument_name = instrument_name_for(token)
+        ticker = self.cache.get(instrument_name, max_age_sec=self.settings['max_age_sec'])
+        if ticker is None:
+            # Стрим выключен, еще не прогрелся или отстал — идем в REST
+            ticker = get_instrument_ticker(token)
+            self.cache.set(instrument_name, ticker)
+            ticker = self.cache.get(instrument_name)
+        return ticker
+
+    def stop(self):
+        if self.stream:
+            self.stream.stop()
@@ -0,0 +1,180 @@
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from utils.logger import logger
+
+BUCKETS_SEC = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+RESERVOIR_SIZE = 1024
+PERCENTILES = (50, 90, 99)
+
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "prometheus_port": None,
+    "snapshot_path": "./logs/metrics.json",
+    "snapshot_interval_sec": 60
+}
+
+
+def proxy_label(proxy: dict) -> str:
+    # Только host:port, логин и пароль прокси в метрики не попадают
+    if not proxy:
+        return "direct"
+    url = urlsplit(proxy.get('https') or proxy.get('http'))
+    return f"{url.hostname}:{url.port}"
+
+
+class Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKETS_SEC) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, seconds: float):
+        self.bucket_counts[bisect.bisect_left(BUCKETS_SEC, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def percentiles(self) -> dict:
+        values = sorted(self.recent)
+        if not values:
+            return {f"p{p}": None for p in PERCENTILES}
+        return {f"p{p}": values[min(len(values) - 1, len(values) * p // 100)] for p in PERCENTILES}
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "labels", "started_at")
+
+    def __init__(self, metrics, stage: str, labels: dict):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started_at, **self.labels)
+        return False
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._snapshot_thread = None
+
+    def timer(self, stage: str, **labels):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage, labels)
+
+    def observe(self, stage: str, seconds: float, **labels):
+        if not self.enabled:
+            return
+        if isinstance(labels.get('proxy'), dict):
+            labels['proxy'] = proxy_label(labels['proxy'])
+
+        # Общая гистограмма по этапу плюс разрезы по каждому лейблу (прокси, аккаунт)
+        keys = [(stage, None, None)] + [(stage, name, value) for name, value in labels.items() if value is not None]
+        with self._lock:
+            for key in keys:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram()
+                histogram.observe(seconds)
+
+    def snapshot(self) -> dict:
+        result = {}
+        with self._lock:
+            for (stage, label, value), histogram in self._histograms.items():
+                stats = {
+                    "count": histogram.count,
+                    "mean": histogram.sum / histogram.count,
+                    **histogram.percentiles()
+                }
+                stage_stats = result.setdefault(stage, {"by": {}})
+                if label is None:
+                    stage_stats.update(stats)
+                else:
+                    stage_stats["by"].setdefault(label, {})[value] = stats
+        return result
+
+    def prometheus_text(self) -> str:
+        lines = ["# TYPE derive_bot_stage_seconds histogram"]
+        with self._lock:
+            for (stage, label, value), histogram in sorted(self._histograms.items(), key=lambda x: tuple(map(str, x[0]))):
+                labels = f'stage="{stage}"' + (f',{label}="{value}"' if label else "")
+                cumulative = 0
+                for bound, count in zip(BUCKETS_SEC + ("+Inf",), histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f'derive_bot_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"derive_bot_stage_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"derive_bot_stage_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"timestamp": time.time(), "stages": self.snapshot()}, file, indent=4)
+        os.replace(tmp_path, path)
+
+    def start_prometheus_server(self, port: int):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Метрики доступны на http://127.0.0.1:{port}/metrics")
+
+    def start_snapshots(self, path: str, interval_sec: float):
+        def run():
+            while True:
+                time.sleep(interval_sec)
+                try:
+                    self.write_snapshot(path)
+                except OSError as e:
+                    logger.warning(f"Не удалось записать снапшот метрик: {e}")
+
+        self._snapshot_thread = threading.Thread(target=run, name="metrics-snapshot", daemon=True)
+        self._snapshot_thread.start()
+
+
+metrics = Metrics()
+
+
+def configure_metrics(settings: dict = None):
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    if not settings['enabled'] or metrics.enabled:
+        return
+
+    metrics.enabled = True
+    if settings['prometheus_port']:
+        metrics.start_prometheus_server(settings['prometheus_port'])
+    if settings['snapshot_path']:
+        metrics.start_snapshots(settings['snapshot_path'], settings['snapshot_interval_sec'])
@@ -1,2 +1,2 @@
-from .signature import create_timestamp_signature
-from .load_json import load_json
\ No newline at end of file
+from .signature import create_timestamp_signature, get_signer, set_signer, Signer
+from .load_json import load_json
@@ -1,10 +1,65 @@
-from eth_account.messages import encode_defunct
-from web3 import Web3
+import threading
 import time
+from functools import cached_property
+
+
+class Signer:
+    # Ключ выводится при первой подписи: импорт eth_account и from_key (~3 мс на аккаунт) не тормозят
+    # разбор creds.txt и команды, которым подпись не нужна
+    def __init__(self, pk: str):
+        self.pk = pk
+
+    @cached_property
+    def account(self):
+        from eth_account import Account
+        return Account.from_key(self.pk)
+
+    @property
+    def address(self) -> str:
+        return self.account.address
+
+    def timestamp_signature(self) -> tuple:
+        from eth_account.messages import encode_defunct
+        timestamp = str(int(time.time() * 1000))
+        message = encode_defunct(text=timestamp)
+        signature = self.account.sign_message(message).signature.hex()
+        return signature, timestamp
+
+    def auth_headers(self, derive_wallet: str) -> dict:
+        signature, timestamp = self.timestamp_signature()
+        return {
+            "X-LyraWallet": derive_wallet,
+            "X-LyraTimestamp": timestamp,
+            "X-LyraSignature": signature,
+        }
+
+    def sign_action(self, action) -> str:
+        # То же самое, что SignedAction.sign, но без повторного вывода ключа через Web3
+        signature = self.account.unsafe_sign_hash(action._to_typed_data_hash())
+        action.signature = signature.signature.hex()
+        return action.signature
+
+
+_signers = {}
+_signers_lock = threading.Lock()
+
+
+def get_signer(pk: str) -> Signer:
+    signer = _signers.get(pk)
+    if signer is None:
+        with _signers_lock:
+            signer = _signers.get(pk)
+            if signer is None:
+                signer = Signer(pk)
+                _signers[pk] = signer
+    return signer
+
+
+def set_signer(pk: str, signer: Signer):
+    # Подмена подписанта для ключа, например на PaperSigner в бумажной торговле
+    with _signers_lock:
+        _signers[pk] = signer
+
 
 def create_timestamp_signature(pk):
-    eoa_wallet = Web3().eth.account.from_key(pk)
-    timestamp = str(int(time.time() * 1000))
-    message = encode_defunct(text=timestamp)
-    signature = eoa_wallet.sign_message(message).signature.hex()
-    return signature, timestamp
\ No newline at end of file
+    return get_signer(pk).timestamp_signature()
@@ -0,0 +1,89 @@
+import uuid
+from decimal import Decimal
+from typing import NamedTuple
+
+# Ответ не дает понять, дошел ли ордер до матчинга (5xx, не JSON): объем исполнения надо сверить с позицией
+UNKNOWN_STATUS = "unknown"
+
+
+class OrderFill(NamedTuple):
+    derive_wallet: str
+    instrument_name: str
+    direction: str
+    requested_amount: float
+    filled_amount: float
+    average_price: float
+    fee: float
+    order_id: str
+    status: str
+    error: str
+    latency_ms: float = 0.0
+
+
+def parse_order_response(response, prepared_order: dict) -> OrderFill:
+    fill = {
+        "derive_wallet": prepared_order['wallet_data']['derive_wallet'],
+        "instrument_name": prepared_order['instrument_ticker']['instrument_name'],
+        "direction": prepared_order['direction'],
+        "requested_amount": float(prepared_order['amount']),
+        "filled_amount": 0.0,
+        "average_price": 0.0,
+        "fee": 0.0,
+        "order_id": "",
+        "status": "rejected",
+        "error": "",
+        "latency_ms": getattr(response, 'elapsed', 0.0) * 1000
+    }
+
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+    if data is None or response.status_code >= 500:
+        return OrderFill(**{**fill, "status": UNKNOWN_STATUS, "error": f"HTTP {response.status_code}: {response.text[:200]}"})
+
+    if data.get('error'):
+        return OrderFill(**{**fill, "error": f"{data['error'].get('code')}: {data['error'].get('message')}"})
+
+    order = data.get('result', {}).get('order', {})
+    return OrderFill(**{
+        **fill,
+        "filled_amount": float(order.get('filled_amount') or 0),
+        "average_price": float(order.get('average_price') or 0),
+        "fee": float(order.get('order_fee') or 0),
+        "order_id": order.get('order_id', ""),
+        "status": order.get('order_status', "")
+    })
+
+
+class CycleRecord:
+    def __init__(self, instrument_name: str):
+        self.cycle_id = uuid.uuid4().hex[:12]
+        self.instrument_name = instrument_name
+        self.fills = []
+
+    def add(self, fill: OrderFill) -> OrderFill:
+        self.fills.append(fill)
+        return fill
+
+    def filled_total(self, direction: str) -> float:
+        # Суммируем в Decimal, чтобы сравнение в шагах amount_step было точным
+        return float(sum((Decimal(str(x.filled_amount)) for x in self.fills if x.direction == direction), Decimal(0)))
+
+    def filled_by_wallet(self, direction: str) -> dict:
+        filled = {}
+        for x in self.fills:
+            if x.direction == direction and x.filled_amount > 0:
+                filled[x.derive_wallet] = float(Decimal(str(filled.get(x.derive_wallet, 0))) + Decimal(str(x.filled_amount)))
+        return filled
+
+    def summary(self) -> dict:
+        return {
+            "cycle_id": self.cycle_id,
+            "instrument_name": self.instrument_name,
+            "orders": len(self.fills),
+            "bought": self.filled_total("buy"),
+            "sold": self.filled_total("sell"),
+            "fees": sum(x.fee for x in self.fills),
+            "errors": [x.error for x in self.fills if x.error]
+        }
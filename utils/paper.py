@@ -0,0 +1,302 @@
+import asyncio
+import bisect
+import json
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from utils.async_http import HttpResponse, run_sync
+from utils.clock import get_clock
+from utils.http_client import set_async_http_client
+from utils.misc import Signer
+from utils.logger import logger
+
+TICKERS_PATH = "./data/tickers.jsonl"
+
+DEFAULT_SETTINGS = {
+    "tickers_path": TICKERS_PATH,
+    # Во сколько раз виртуальное время быстрее реального, 0 — паузы пропускаются мгновенно
+    "speed": 0,
+    "initial_balance_usd": 1000,
+    "fee_rate": 0.0003,
+    "slippage_bps": 1,
+    "latency_ms": 50,
+    "jitter_ms": 20,
+    "reject_rate": 0,
+    "partial_fill_rate": 0,
+    "max_cycles": 100,
+    "seed": None,
+    # false — без ECDSA: на чистом Python подпись стоит ~5 мс, а бумажная биржа подписи не проверяет
+    "sign_orders": True
+}
+
+
+def _parse_body(body: dict, data: str) -> dict:
+    if body is not None:
+        return body
+    return json.loads(data) if data else {}
+
+
+class PaperSigner(Signer):
+    PAPER_SIGNATURE = "0x" + "00" * 65
+
+    def timestamp_signature(self) -> tuple:
+        return self.PAPER_SIGNATURE, str(int(get_clock().time() * 1000))
+
+    def sign_action(self, action) -> str:
+        action.signature = self.PAPER_SIGNATURE
+        return action.signature
+
+
+class TickerReplay:
+    # Записанные снапшоты get_ticker, строка JSONL: {"ts": ..., "ticker": {...}}.
+    # Виртуальные часы стартуют с начала записи, по инструменту отдается последний снапшот не позже текущего момента
+    def __init__(self, path: str = TICKERS_PATH):
+        self.path = path
+        self._times = {}
+        self._tickers = {}
+
+        with open(path, "r", encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file if line.strip()]
+        if not rows:
+            raise ValueError(f"В {path} нет записанных тикеров")
+
+        for row in sorted(rows, key=lambda x: x['ts']):
+            instrument_name = row['ticker']['instrument_name']
+            self._times.setdefault(instrument_name, []).append(row['ts'])
+            self._tickers.setdefault(instrument_name, []).append(row['ticker'])
+
+        self.start = min(times[0] for times in self._times.values())
+        self.end = max(times[-1] for times in self._times.values())
+
+    @property
+    def instruments(self) -> list:
+        return list(self._tickers)
+
+    def get(self, instrument_name: str, ts: float) -> dict:
+        times = self._times.get(instrument_name)
+        if times is None:
+            raise ValueError(f"В записи {self.path} нет тикеров {instrument_name}")
+        index = max(bisect.bisect_right(times, ts) - 1, 0)
+        return self._tickers[instrument_name][index]
+
+
+class PaperExchange:
+    # Биржа в памяти: исполняет подписанные ордера по записанным тикерам с проскальзыванием, комиссией,
+    # отказами и частичными исполнениями. Ответы в формате Derive API, поэтому разбор ответов тот же, что в бою
+    def __init__(self, replay: TickerReplay, settings: dict = None, rng: random.Random = None):
+        self.replay = replay
+        self.settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        # rng — только джиттер латентности. При speed=0 латентность не двигает виртуальные часы,
+        # а при speed>0 время симуляции и так зависит от реального
+        self.rng = rng or random.Random(self.settings['seed'])
+        self._seed = self.settings['seed'] if self.settings['seed'] is not None else random.getrandbits(64)
+
+        self.subaccounts = {}
+        self.cash = {}
+        self.positions = {}
+        self.stats = {"orders": 0, "rejected": 0, "volume_usd": 0.0, "fees_usd": 0.0}
+        self._order_counts = {}
+        self._partially_filled = {}
+        self._lock = threading.Lock()
+
+    def register(self, wallet: str, subaccount_id: int):
+        with self._lock:
+            self.subaccounts.setdefault(wallet, set()).add(subaccount_id)
+            self.cash.setdefault(subaccount_id, Decimal(str(self.settings['initial_balance_usd'])))
+
+    def current_ticker(self, instrument_name: str) -> dict:
+        return self.replay.get(instrument_name, get_clock().time())
+
+    def ticker(self, body: dict, headers: dict) -> dict:
+        return {"result": self.current_ticker(body['instrument_name'])}
+
+    def _reject(self, message: str) -> dict:
+        with self._lock:
+            self.stats['orders'] += 1
+            self.stats['rejected'] += 1
+        return {"error": {"code": -32000, "message": message}}
+
+    def _order_rng(self, subaccount_id: int) -> random.Random:
+        # Свой генератор на каждый ордер из seed, сабаккаунта и номера его ордера. В одновременном режиме ноги
+        # идут из разных потоков, и с общим генератором отказ или частичное исполнение доставались бы ноге,
+        # которая первой успела. Сабаккаунт в цикле в одной ноге, поэтому номер его ордера от потоков не зависит
+        with self._lock:
+            index = self._order_counts.get(subaccount_id, 0)
+            self._order_counts[subaccount_id] = index + 1
+        return random.Random(f"{self._seed}:{subaccount_id}:{index}")
+
+    def order(self, body: dict, headers: dict) -> dict:
+        ticker = self.current_ticker(body['instrument_name'])
+        is_buy = body['direction'] == "buy"
+        sign = 1 if is_buy else -1
+        amount = Decimal(body['amount'])
+        limit_price = Decimal(body['limit_price'])
+        rng = self._order_rng(body['subaccount_id'])
+
+        if rng.random() < self.settings['reject_rate']:
+            return self._reject("Симулированный отказ биржи")
+
+        slippage = Decimal(str(self.settings['slippage_bps'])) / 10000
+        if is_buy:
+            price = Decimal(str(ticker['best_ask_price'])) * (1 + slippage)
+        else:
+            price = Decimal(str(ticker['best_bid_price'])) * (1 - slippage)
+        if (is_buy and price > limit_price) or (not is_buy and price < limit_price):
+            return self._reject(f"Цена {price} хуже лимита ордера {limit_price}")
+
+        subaccount_id = body['subaccount_id']
+        instrument_name = body['instrument_name']
+        # Частичное исполнение — ордер съел ликвидность у лучшей цены. К следующему ордеру того же сабаккаунта
+        # в ту же сторону (добор остатка) стакан успевает восстановиться, и он исполняется полностью.
+        # Иначе при partial_fill_rate ~0.3 добор регулярно исполнялся бы частично MAX_TOPUP_ATTEMPTS раз подряд
+        # Любой следующий ордер по инструменту снимает отметку, чтобы она не дожила до следующего цикла
+        with self._lock:
+            refilled = self._partially_filled.pop((subaccount_id, instrument_name), None) == body['direction']
+
+        filled = amount
+        if not refilled and rng.random() < self.settings['partial_fill_rate']:
+            step = Decimal(str(ticker['amount_step']))
+            filled = max(step, (amount / 2 // step) * step)
+            if filled < amount:
+                with self._lock:
+                    self._partially_filled[(subaccount_id, instrument_name)] = body['direction']
+
+        with self._lock:
+            positions = self.positions.setdefault(subaccount_id, {})
+            position = positions.get(instrument_name, Decimal(0))
+            if body.get('reduce_only'):
+                filled = min(filled, abs(position)) if position * sign < 0 else Decimal(0)
+
+            fee = filled * price * Decimal(str(self.settings['fee_rate']))
+            positions[instrument_name] = position + sign * filled
+            self.cash[subaccount_id] = self.cash.get(subaccount_id, Decimal(0)) - sign * filled * price - fee
+            self.stats['orders'] += 1
+            self.stats['volume_usd'] += float(filled * price)
+            self.stats['fees_usd'] += float(fee)
+
+        return {"result": {
+            "order": {
+                "order_id": uuid.uuid4().hex,
+                "instrument_name": instrument_name,
+                "direction": body['direction'],
+                "amount": str(amount),
+                "filled_amount": str(filled),
+                "average_price": str(price),
+                "order_fee": str(fee),
+                "order_status": "filled"
+            },
+            "trades": []
+        }}
+
+    def subaccount_value(self, subaccount_id: int) -> Decimal:
+        # Деньги плюс позиции по марк-цене: покупка уменьшает деньги ровно на стоимость позиции
+        positions = self.positions.get(subaccount_id, {})
+        return self.cash[subaccount_id] + sum(
+            (amount * Decimal(str(self.current_ticker(instrument_name)['mark_price'])) for instrument_name, amount in positions.items()),
+            Decimal(0)
+        )
+
+    def portfolios(self, body: dict, headers: dict) -> dict:
+        with self._lock:
+            subaccount_ids = sorted(self.subaccounts.get(body['wallet'], set()))
+            return {"result": [
+                {
+                    "subaccount_id": subaccount_id,
+                    "subaccount_value": str(self.subaccount_value(subaccount_id)),
+                    "positions": [
+                        {
+                            "instrument_name": instrument_name,
+                            "amount": str(amount),
+                            "mark_price": str(self.current_ticker(instrument_name)['mark_price'])
+                        }
+                        for instrument_name, amount in self.positions.get(subaccount_id, {}).items()
+                        if amount != 0
+                    ]
+                }
+                for subaccount_id in subaccount_ids
+            ]}
+
+    def equity(self) -> float:
+        with self._lock:
+            return float(sum((self.subaccount_value(x) for x in self.cash), Decimal(0)))
+
+    def handle(self, path: str, body: dict, headers: dict) -> tuple:
+        routes = {
+            "/public/get_ticker": self.ticker,
+            "/public/get_time": lambda body, headers: {"result": int(get_clock().time() * 1000)},
+            "/private/order": self.order,
+            "/private/get_all_portfolios": self.portfolios
+        }
+        if path not in routes:
+            return 404, {"error": {"code": 404, "message": f"Метод {path} не поддерживается в бумажной торговле"}}
+        return 200, routes[path](body, headers)
+
+
+class PaperHttpClient:
+    # Подменяет AsyncHttpClient: тот же post/get, но запросы уходят в PaperExchange, а латентность
+    # симулируется и сжимается виртуальными часами. Подпись ордеров и разбор ответов остаются боевыми
+    def __init__(self, exchange: PaperExchange):
+        self.exchange = exchange
+        self.settings = exchange.settings
+        self.observers = []
+
+    def _latency(self) -> float:
+        latency_ms = self.settings['latency_ms'] + self.exchange.rng.uniform(-self.settings['jitter_ms'], self.settings['jitter_ms'])
+        return max(0.0, latency_ms) / 1000
+
+    async def request(self, url: str, body: dict, headers: dict = None, proxy: dict = None) -> HttpResponse:
+        latency = self._latency()
+        speed = getattr(get_clock(), "speed", 1)
+        if speed:
+            await asyncio.sleep(latency / speed)
+
+        status, payload = self.exchange.handle(urlsplit(url).path, body, headers or {})
+        for observer in self.observers:
+            observer(proxy, latency, status < 400)
+        return HttpResponse(status, json.dumps(payload), {}, latency)
+
+    async def post(self, url: str, json: dict = None, headers: dict = None, proxy: dict = None, timeout: float = None, data: str = None,
+                   idempotent: bool = True, retries: int = None) -> HttpResponse:
+        return await self.request(url, _parse_body(json, data), headers, proxy)
+
+    async def get(self, url: str, headers: dict = None, proxy: dict = None, timeout: float = None) -> HttpResponse:
+        return await self.request(url, {}, headers, proxy)
+
+    async def close(self):
+        pass
+
+
+def enable_paper_trading(exchange: PaperExchange) -> PaperHttpClient:
+    # Все запросы бота (тикеры, ордера, балансы, экстренное закрытие) идут в бумажную биржу
+    client = PaperHttpClient(exchange)
+    set_async_http_client(client)
+    logger.warning("Бумажная торговля: ордера исполняет симулятор, реальные запросы к бирже не отправляются")
+    return client
+
+
+async def record_tickers_async(tokens: list, interval_sec: float, duration_sec: float, path: str = TICKERS_PATH) -> int:
+    from utils.trade import get_instrument_ticker_async
+
+    recorded = 0
+    finished_at = time.monotonic() + duration_sec
+    with open(path, "a", encoding="utf-8") as file:
+        while time.monotonic() < finished_at:
+            started_at = time.monotonic()
+            tickers = await asyncio.gather(*(get_instrument_ticker_async(token) for token in tokens), return_exceptions=True)
+            for token, ticker in zip(tokens, tickers):
+                if isinstance(ticker, Exception):
+                    logger.warning(f"Не удалось записать тикер {token}: {ticker}")
+                    continue
+                file.write(json.dumps({"ts": time.time(), "ticker": ticker}) + "\n")
+                recorded += 1
+            file.flush()
+            await asyncio.sleep(max(0, interval_sec - (time.monotonic() - started_at)))
+    return recorded
+
+
+def record_tickers(tokens: list, interval_sec: float, duration_sec: float, path: str = TICKERS_PATH) -> int:
+    return run_sync(record_tickers_async(tokens, interval_sec, duration_sec, path))
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from utils.async_http import run_sync
+from utils.http_client import get_async_http_client, API_BASE_URL
+from utils.metrics import proxy_label
+from utils.logger import logger
+
+PROBE_ENDPOINT = f"{API_BASE_URL}/public/get_time"
+
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "window": 50,
+    "min_samples": 5,
+    "max_error_rate": 0.3,
+    "max_latency_p90_sec": 3.0,
+    "probe_interval_sec": 60,
+    "probe_timeout_sec": 5
+}
+
+
+class ProxyHealthTracker:
+    # Скользящее окно (латентность, успех) на прокси: реальные запросы через AsyncHttpClient.observers плюс пробы
+    def __init__(self):
+        self.enabled = False
+        self.settings = dict(DEFAULT_SETTINGS)
+        self._samples = {}
+        self._proxies = {}
+        self._lock = threading.Lock()
+        self._probe_thread = None
+
+    def record(self, proxy: dict, seconds: float, ok: bool):
+        if not self.enabled:
+            return
+        key = proxy_label(proxy)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.settings['window'])
+            samples.append((seconds, ok))
+
+    def stats(self, proxy: dict) -> dict:
+        with self._lock:
+            samples = list(self._samples.get(proxy_label(proxy), ()))
+
+        latencies = sorted(seconds for seconds, ok in samples if ok)
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "samples": len(samples),
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+            "latency_p90": latencies[min(len(latencies) - 1, len(latencies) * 9 // 10)] if latencies else None
+        }
+
+    def is_healthy(self, proxy: dict) -> bool:
+        if not self.enabled:
+            return True
+
+        stats = self.stats(proxy)
+        # Пока данных мало, прокси считается здоровым: его проверили при старте
+        if stats['samples'] < self.settings['min_samples']:
+            return True
+        if stats['error_rate'] > self.settings['max_error_rate']:
+            return False
+        return stats['latency_p90'] is None or stats['latency_p90'] <= self.settings['max_latency_p90_sec']
+
+    def latency(self, proxy: dict) -> float:
+        # Для сортировки: прокси без успешных замеров идут в конец
+        latency = self.stats(proxy)['latency_p50']
+        return float('inf') if latency is None else latency
+
+    def badness(self, proxy: dict) -> tuple:
+        stats = self.stats(proxy)
+        return stats['error_rate'], stats['latency_p90'] or float('inf')
+
+    def watch(self, proxies: list):
+        with self._lock:
+            self._proxies = {proxy_label(proxy): proxy for proxy in proxies}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            proxies = list(self._proxies.items())
+        return {label: {**self.stats(proxy), "healthy": self.is_healthy(proxy)} for label, proxy in proxies}
+
+    async def probe_async(self):
+        with self._lock:
+            proxies = list(self._proxies.values())
+
+        client = get_async_http_client()
+
+        async def probe(proxy):
+            # Результат записывает observer клиента, здесь ошибки только глушим
+            try:
+                await client.post(PROBE_ENDPOINT, json={}, proxy=proxy, timeout=self.settings['probe_timeout_sec'])
+            except Exception:
+                pass
+
+        await asyncio.gather(*(probe(proxy) for proxy in proxies))
+
+    def start_probes(self, interval_sec: float):
+        def run():
+            while True:
+                time.sleep(interval_sec)
+                run_sync(self.probe_async())
+                unhealthy = [label for label, stats in self.snapshot().items() if not stats['healthy']]
+                if unhealthy:
+                    logger.warning(f"Нездоровые прокси: {', '.join(unhealthy)}")
+
+        self._probe_thread = threading.Thread(target=run, name="proxy-health", daemon=True)
+        self._probe_thread.start()
+
+
+proxy_health = ProxyHealthTracker()
+
+
+def configure_proxy_health(settings: dict = None, proxies: list = None):
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    if not settings['enabled'] or proxy_health.enabled:
+        return
+
+    proxy_health.settings = settings
+    proxy_health.enabled = True
+    proxy_health.watch(proxies or [])
+    get_async_http_client().observers.append(proxy_health.record)
+    if settings['probe_interval_sec']:
+        proxy_health.start_probes(settings['probe_interval_sec'])
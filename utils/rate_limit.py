@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "endpoints": {
+        "default": {"rate_per_sec": 100, "burst": 200},
+        "/private/order": {"rate_per_sec": 500, "burst": 1000}
+    },
+    "per_wallet": {"rate_per_sec": 10, "burst": 20}
+}
+
+
+class TokenBucket:
+    # Резервирует токен сразу и возвращает, сколько ждать: ожидающие не обгоняют друг друга
+    def __init__(self, rate_per_sec: float, burst: float):
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate_per_sec)
+            self._updated_at = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate_per_sec
+
+
+class RateLimiter:
+    def __init__(self, endpoints: dict, per_wallet: dict):
+        self.endpoint_settings = endpoints
+        self.per_wallet_settings = per_wallet
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: tuple, settings: dict) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(settings['rate_per_sec'], settings['burst'])
+        return bucket
+
+    async def acquire(self, endpoint: str, wallet: str = None):
+        if endpoint in self.endpoint_settings:
+            delay = self._bucket(("endpoint", endpoint), self.endpoint_settings[endpoint]).reserve()
+        else:
+            delay = self._bucket(("endpoint", "default"), self.endpoint_settings['default']).reserve()
+        if wallet and self.per_wallet_settings:
+            delay = max(delay, self._bucket(("wallet", wallet), self.per_wallet_settings).reserve())
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class RetryBudget:
+    # Повторы не больше ratio от числа запросов (плюс минимум в секунду), чтобы ретраи не добивали биржу при сбое
+    def __init__(self, ratio: float, min_per_sec: float = 1, cap: float = 100):
+        self.ratio = ratio
+        self.min_per_sec = min_per_sec
+        self.cap = cap
+        self._balance = cap
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance = min(self.cap, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._balance = min(self.cap, self._balance + (now - self._updated_at) * self.min_per_sec)
+            self._updated_at = now
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+def build_rate_limiter(settings: dict = None) -> RateLimiter:
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    if not settings['enabled']:
+        return None
+    endpoints = {**DEFAULT_SETTINGS['endpoints'], **settings['endpoints']}
+    return RateLimiter(endpoints, settings['per_wallet'])
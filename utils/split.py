@@ -0,0 +1,14 @@
+from decimal import Decimal
+
+
+def to_step_units(amount: float, amount_step: float) -> int:
+    # Через str(), чтобы 0.72 / 0.01 не превращалось в 71.99999999999999
+    units = Decimal(str(amount)) / Decimal(str(amount_step))
+    if units != units.to_integral_value():
+        raise ValueError(f"Сумма {amount} не кратна шагу {amount_step}")
+    return int(units)
+
+
+def from_step_units(units: int, amount_step: float) -> float:
+    return float(units * Decimal(str(amount_step)))
+
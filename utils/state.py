@@ -1,33 +1,94 @@
 import time
 import random
-import json
-import requests
+import asyncio
+import threading
 
 from utils.initial_data_extract import extract_data
-from utils.misc import create_timestamp_signature
+from utils.misc import get_signer, load_json
+from utils.async_http import run_sync
+from utils.http_client import get_async_http_client, API_BASE_URL
+from utils.state_store import get_state_store
+from utils.metrics import metrics
 from utils.logger import logger
 
-API_URL = "https://api.lyra.finance/private/get_all_portfolios"
+API_URL = f"{API_BASE_URL}/private/get_all_portfolios"
+# Чтение портфелей идемпотентно, а без него не работают ни проверки, ни экстренное закрытие: повторов больше, чем по умолчанию
+PORTFOLIO_RETRIES = 5
 
+DEFAULT_REFRESH_SETTINGS = {
+    "max_workers": 8,
+    "min_interval_per_proxy_sec": {
+        "min": 0.2,
+        "max": 1.0
+    }
+}
+
+
+class ProxyThrottle:
+    # Минимальный рандомный интервал между запросами через один и тот же прокси
+    def __init__(self, min_interval_sec: float, max_interval_sec: float):
+        self.min_interval_sec = min_interval_sec
+        self.max_interval_sec = max_interval_sec
+        self._next_allowed = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, proxy: dict) -> float:
+        key = proxy.get('https') or proxy.get('http') if proxy else ""
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_allowed.get(key, now))
+            self._next_allowed[key] = start_at + random.uniform(self.min_interval_sec, self.max_interval_sec)
+        return start_at - now
+
+    def wait(self, proxy: dict):
+        delay = self._reserve(proxy)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, proxy: dict):
+        delay = self._reserve(proxy)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def portfolio_headers(data) -> dict:
+    signer = data.get('signer') or get_signer(data['session_pk'])
+    return signer.auth_headers(data['derive_wallet'])
 
-def get_account_info(data) -> dict:
-    signature, timestamp = create_timestamp_signature(data['session_pk'])
 
+async def get_all_portfolios_async(data) -> list:
     payload = {"wallet": data['derive_wallet']}
-    headers = {
-        "X-LyraWallet": data['derive_wallet'],
-        "X-LyraTimestamp": timestamp,
-        "X-LyraSignature": signature,
-    }
+    # Подпись заголовков (ECDSA) в пуле потоков, чтобы не держать общий event loop
+    headers = await asyncio.get_running_loop().run_in_executor(None, portfolio_headers, data)
+
+    with metrics.timer("get_account_info", proxy=data['proxy'], account=data['derive_wallet']):
+        response = await get_async_http_client().post(
+            API_URL,
+            json=payload,
+            headers=headers,
+            proxy=data['proxy'],
+            retries=PORTFOLIO_RETRIES
+        )
+
+    # Ошибка API не должна превращаться в пустой список: иначе дальше падает "subacc_id ... не найден".
+    # 5xx к этому моменту уже повторены клиентом
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    if response.status_code >= 400 or not isinstance(body, dict):
+        raise ValueError(f"get_account_info: HTTP {response.status_code} для {data['derive_wallet']}: {response.text[:200]}")
+    if body.get('error'):
+        raise ValueError(f"get_account_info: ошибка API для {data['derive_wallet']}: {body['error'].get('code')}: {body['error'].get('message')}")
+    return body.get('result', [])
+
+
+def get_all_portfolios(data) -> list:
+    return run_sync(get_all_portfolios_async(data))
 
-    response = requests.post(
-        API_URL,
-        json=payload,
-        headers=headers,
-        proxies=data['proxy']
-    ).json()
 
-    for account in response.get('result', []):
+def select_subaccount(portfolios: list, data) -> dict:
+    for account in portfolios:
         if account['subaccount_id'] == data['subacc_id']:
             return account
 
@@ -36,24 +97,74 @@ def get_account_info(data) -> dict:
     )
 
 
-def update_accounts_state():
-    accounts = extract_data()
-    all_info = []
+async def get_account_info_async(data) -> dict:
+    return select_subaccount(await get_all_portfolios_async(data), data)
+
+
+def get_account_info(data) -> dict:
+    return run_sync(get_account_info_async(data))
 
+
+async def fetch_accounts_info_async(accounts: list, max_workers: int = None, throttle: ProxyThrottle = None) -> list:
+    # Несколько сабаккаунтов могут сидеть на одном кошельке, портфели кошелька запрашиваются один раз
+    wallets = {}
     for account in accounts:
-        info = get_account_info(account)
-        result = {
+        wallets.setdefault(account['derive_wallet'], account)
+
+    semaphore = asyncio.Semaphore(max(1, min(max_workers or len(wallets), len(wallets))))
+
+    async def fetch(account):
+        async with semaphore:
+            if throttle:
+                await throttle.wait_async(account['proxy'])
+            return account['derive_wallet'], await get_all_portfolios_async(account)
+
+    portfolios = dict(await asyncio.gather(*(fetch(account) for account in wallets.values())))
+
+    return [select_subaccount(portfolios[account['derive_wallet']], account) for account in accounts]
+
+
+def fetch_accounts_info(accounts: list, max_workers: int = None, throttle: ProxyThrottle = None) -> list:
+    return run_sync(fetch_accounts_info_async(accounts, max_workers, throttle))
+
+
+def refresh_accounts_info(accounts: list) -> list:
+    settings = {**DEFAULT_REFRESH_SETTINGS, **load_json("./config.json").get("state_refresh", {})}
+    interval = settings['min_interval_per_proxy_sec']
+    throttle = ProxyThrottle(interval['min'], interval['max'])
+
+    return fetch_accounts_info(accounts, max_workers=settings['max_workers'], throttle=throttle)
+
+
+def open_notional_usd(info: dict) -> float:
+    return sum(abs(float(position['amount'])) * float(position.get('mark_price') or 0) for position in info.get('positions', []))
+
+
+def save_accounts_state(accounts: list, infos: list, keep_wallets: set = None):
+    all_info = [
+        {
             "derive_wallet": account['derive_wallet'],
-            "subaccount_value": float(info['subaccount_value'])
+            "subaccount_value": float(info['subaccount_value']),
+            "open_notional_usd": open_notional_usd(info)
         }
-        all_info.append(result)
-        time.sleep(random.uniform(0.2, 1.0))
+        for account, info in zip(accounts, infos)
+    ]
 
-    with open("./data/state.json", "w", encoding="utf-8") as file:
-        json.dump(all_info, file, ensure_ascii=False, indent=4)
+    state_store = get_state_store()
+    state_store.update(all_info, keep_wallets)
+    state_store.flush()
 
     logger.success("Информация о текущем состоянии аккаунтов обновлена в data/state.json")
 
 
+def update_accounts_state(derive_wallets: list = None):
+    accounts = extract_data()
+    keep_wallets = {account['derive_wallet'] for account in accounts}
+    if derive_wallets is not None:
+        derive_wallets = set(derive_wallets)
+        accounts = [account for account in accounts if account['derive_wallet'] in derive_wallets]
+
+    save_accounts_state(accounts, refresh_accounts_info(accounts), keep_wallets)
+
 if __name__ == "__main__":
     update_accounts_state()
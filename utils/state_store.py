@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import threading
+
+from utils.misc import load_json
+
+STATE_PATH = "./data/state.json"
+
+
+class AccountStateStore:
+    def __init__(self, path: str = STATE_PATH):
+        self.path = path
+        self._records = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+
+        for record in load_json(self.path):
+            self._records[record['derive_wallet']] = record
+
+    def get(self, derive_wallet: str) -> dict:
+        return self._records.get(derive_wallet)
+
+    def all(self) -> list:
+        with self._lock:
+            return list(self._records.values())
+
+    def update(self, records: list, keep_wallets: set = None):
+        # keep_wallets — кошельки из текущего creds.txt: записи удаленных из него кошельков выбрасываются,
+        # иначе они попадут в TradeManager.state и пул аренды планировщика
+        with self._lock:
+            if keep_wallets is not None:
+                for derive_wallet in [x for x in self._records if x not in keep_wallets]:
+                    del self._records[derive_wallet]
+                    self._dirty = True
+
+            for record in records:
+                if self._records.get(record['derive_wallet']) != record:
+                    self._records[record['derive_wallet']] = record
+                    self._dirty = True
+
+    def flush(self):
+        # JSON не дописывается по частям, поэтому файл переписывается целиком, но только если что-то изменилось
+        with self._lock:
+            if not self._dirty:
+                return
+            data = list(self._records.values())
+            self._dirty = False
+
+        # Пишем во временный файл рядом и атомарно подменяем, чтобы при падении не остался обрезанный state.json
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".state-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(data, file, ensure_ascii=False, indent=4)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                self._dirty = True
+            raise
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_state_store(path: str = STATE_PATH) -> AccountStateStore:
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = AccountStateStore(path)
+        return _stores[key]
@@ -1,9 +1,11 @@
-import requests
 import json
+import asyncio
+from utils.async_http import run_sync
+from utils.http_client import get_async_http_client, API_BASE_URL
 from utils.logger import logger
 
 
-def update_tokens_info():
+async def update_tokens_info_async():
     with open("./config.json", "r", encoding="utf-8") as file:
         config = json.load(file)
 
@@ -11,19 +13,18 @@ def update_tokens_info():
     if not tokens:
         raise ValueError("В config.json отсутствуют токены в 'pair_probability'.")
 
-    all_info = []
-    url = "https://api.lyra.finance/public/get_ticker"
+    url = f"{API_BASE_URL}/public/get_ticker"
     headers = {
         "accept": "application/json",
         "content-type": "application/json"
     }
 
-    for token in tokens:
+    async def fetch(token):
         payload = {
             "instrument_name": f"{token}-PERP"
         }
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = await get_async_http_client().post(url, json=payload, headers=headers, timeout=10)
             response.raise_for_status()  # Проверяем HTTP ошибки (4xx, 5xx)
             data = response.json()
 
@@ -34,11 +35,17 @@ def update_tokens_info():
                 "minimum_amount": float(data['result']['minimum_amount'])
             }
 
-            all_info.append(result)
             logger.info(f"Данные для токена {token} успешно обновлены.")
+            return result
 
         except:
             raise ValueError(f"Ошибка при обработке токена {token}")
 
+    all_info = await asyncio.gather(*(fetch(token) for token in tokens))
+
     with open("./data/tokens.json", "w", encoding="utf-8") as file:
         json.dump(all_info, file, ensure_ascii=False, indent=4)
+
+
+def update_tokens_info():
+    return run_sync(update_tokens_info_async())
@@ -1,46 +1,76 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
 from decimal import Decimal
-from eth_account.messages import encode_defunct
-from web3 import Web3
-import requests
 
-from lyra_v2_action_signing import SignedAction, TradeModuleData, utils
-from utils.misc import create_timestamp_signature
+from utils.misc import get_signer
+from utils.async_http import run_sync
+from utils.http_client import get_async_http_client, API_BASE_URL
+from utils.metrics import metrics
 
 
 DOMAIN_SEPARATOR = "0xd96e5f90797da7ec8dc4e276260c7f3f87fedf68775fbe1ef116e996fc60441b"
 ACTION_TYPEHASH = "0x4d7a9f27c403ff9c0f19bce61d76d82f9aa29f8d6d4b0c5474607d9770d1af17"
 TRADE_MODULE_ADDRESS = "0xB8D20c2B7a1Ad2EE33Bc50eF10876eD3035b5e7b"
-ORDER_ENDPOINT = "https://api.lyra.finance/private/order"
-TICKER_ENDPOINT = "https://api.lyra.finance/public/get_ticker"
+ORDER_ENDPOINT = f"{API_BASE_URL}/private/order"
+TICKER_ENDPOINT = f"{API_BASE_URL}/public/get_ticker"
+AUTH_HEADERS_TTL_SEC = 10
+
+_nonce_counter = itertools.count()
+_nonce_lock = threading.Lock()
+
+
+async def get_instrument_ticker_async(token):
+    with metrics.timer("get_instrument_ticker"):
+        response = await get_async_http_client().post(
+            TICKER_ENDPOINT,
+            json= { "instrument_name": f"{token.upper()}-PERP" },
+            headers={
+                "accept": "application/json",
+                "content-type": "application/json"
+            }
+            # proxies=proxy
+        )
+        return response.json()["result"]
 
 
 def get_instrument_ticker(token):
-    response = requests.post(
-        TICKER_ENDPOINT,
-        json= { "instrument_name": f"{token.upper()}-PERP" },
-        headers={
-            "accept": "application/json",
-            "content-type": "application/json"
-        }
-        # proxies=proxy
-    )
-    return response.json()["result"]
+    return run_sync(get_instrument_ticker_async(token))
+
+
+def load_signing():
+    # lyra_v2_action_signing тянет web3, это самый долгий импорт в боте. Грузим его при первой подписи ордера,
+    # а close-all прогревает заранее в фоне, пока запрашивает позиции
+    import lyra_v2_action_signing
+    return lyra_v2_action_signing
 
 
 def generate_signature(wallet, timestamp):
+    from eth_account.messages import encode_defunct
     lyra_message = encode_defunct(text=timestamp)
     return wallet.sign_message(lyra_message).signature.hex()
 
 
-def create_action(wallet_data, eoa_wallet, instrument_ticker, amount, limit_price, is_bid):
-    return SignedAction(
+def next_action_nonce(signing) -> int:
+    # Миллисекунды + 3 цифры счетчика процесса. get_action_nonce() по умолчанию дописывает "0", и ордера,
+    # подписанные пачкой в одну миллисекунду (экстренное закрытие), получали одинаковый nonce и отклонялись как повтор
+    with _nonce_lock:
+        nonce_iter = next(_nonce_counter) % 1000
+    return int(f"{signing.utils.utc_now_ms()}{nonce_iter:03d}")
+
+
+def create_action(wallet_data, signer_address, instrument_ticker, amount, limit_price, is_bid):
+    signing = load_signing()
+    return signing.SignedAction(
         subaccount_id=wallet_data['subacc_id'],
         owner=wallet_data['derive_wallet'],
-        signer=eoa_wallet.address,
-        signature_expiry_sec=utils.MAX_INT_32,
-        nonce=utils.get_action_nonce(),
+        signer=signer_address,
+        signature_expiry_sec=signing.utils.MAX_INT_32,
+        nonce=next_action_nonce(signing),
         module_address=TRADE_MODULE_ADDRESS,
-        module_data=TradeModuleData(
+        module_data=signing.TradeModuleData(
             asset_address=instrument_ticker["base_asset_address"],
             sub_id=int(instrument_ticker["base_asset_sub_id"]),
             limit_price=Decimal(str(limit_price)),
@@ -54,7 +84,7 @@ def create_action(wallet_data, eoa_wallet, instrument_ticker, amount, limit_pric
     )
 
 
-def send_order(wallet_data, instrument_ticker, direction, action, headers):
+def build_order_payload(instrument_ticker, direction, action, reduce_only=False) -> dict:
     payload = {
         "instrument_name": instrument_ticker["instrument_name"],
         "direction": direction,
@@ -62,41 +92,121 @@ def send_order(wallet_data, instrument_ticker, direction, action, headers):
         "time_in_force": "gtc",
         **action.to_json(),
     }
-
-    response = requests.post(
-        ORDER_ENDPOINT,
-        json=payload,
-        headers=headers,
-        proxies=wallet_data['proxy']
-    )
-    return response
+    if reduce_only:
+        payload["reduce_only"] = True
+    return payload
 
 
-def open_order(wallet_data, instrument_ticker, amount, direction):
-    eoa_wallet = Web3().eth.account.from_key(wallet_data['session_pk'])
-    lyra_signature, timestamp_ms = create_timestamp_signature(wallet_data['session_pk'])
+def prepare_order(wallet_data, instrument_ticker, amount, direction, reduce_only=False) -> dict:
+    account = wallet_data['derive_wallet']
+    with metrics.timer("open_order.key_load", account=account):
+        signer = wallet_data.get('signer') or get_signer(wallet_data['session_pk'])
 
     limit_price = instrument_ticker['max_price'] if direction == "long" else instrument_ticker['min_price']
     is_bid = direction == "long"
 
-    action = create_action(wallet_data, eoa_wallet, instrument_ticker, amount, limit_price, is_bid)
-    action.sign(wallet_data['session_pk'])
+    with metrics.timer("open_order.action_build", account=account):
+        action = create_action(wallet_data, signer.address, instrument_ticker, amount, limit_price, is_bid)
+    with metrics.timer("open_order.sign", account=account):
+        signer.sign_action(action)
+
+    direction = "buy" if is_bid else "sell"
+    payload = build_order_payload(instrument_ticker, direction, action, reduce_only=reduce_only)
 
-    headers = {
-        "X-LyraWallet": wallet_data['derive_wallet'],
-        "X-LyraTimestamp": timestamp_ms,
-        "X-LyraSignature": lyra_signature
+    return {
+        "wallet_data": wallet_data,
+        "instrument_ticker": instrument_ticker,
+        "direction": direction,
+        "amount": amount,
+        "reduce_only": reduce_only,
+        "action": action,
+        "body": json.dumps(payload),
+        "headers": signer.auth_headers(wallet_data['derive_wallet']),
+        "headers_created_at": time.time(),
     }
 
-    response = send_order(wallet_data, instrument_ticker, "buy" if is_bid else "sell", action, headers)
+
+def headers_expired(prepared_order: dict) -> bool:
+    return time.time() - prepared_order['headers_created_at'] > AUTH_HEADERS_TTL_SEC
+
+
+def order_headers(prepared_order: dict) -> dict:
+    wallet_data = prepared_order['wallet_data']
+
+    # Подпись ордера не протухает (MAX_INT_32), а таймстемп в заголовках авторизации обновляем
+    headers = prepared_order['headers']
+    if headers_expired(prepared_order):
+        signer = wallet_data.get('signer') or get_signer(wallet_data['session_pk'])
+        headers = signer.auth_headers(wallet_data['derive_wallet'])
+    return {**headers, "content-type": "application/json"}
+
+
+async def submit_order_async(prepared_order: dict):
+    wallet_data = prepared_order['wallet_data']
+    if headers_expired(prepared_order):
+        # Переподпись — это ECDSA, на общем event loop она задержала бы остальные запросы
+        headers = await asyncio.get_running_loop().run_in_executor(None, order_headers, prepared_order)
+    else:
+        headers = order_headers(prepared_order)
+
+    with metrics.timer("open_order.http", proxy=wallet_data['proxy'], account=wallet_data['derive_wallet']):
+        response = await get_async_http_client().post(
+            ORDER_ENDPOINT,
+            data=prepared_order['body'],
+            headers=headers,
+            proxy=wallet_data['proxy'],
+            idempotent=False
+        )
     return response
 
 
+def submit_order(prepared_order: dict):
+    return run_sync(submit_order_async(prepared_order))
+
+
+async def submit_orders_concurrently_async(prepared_orders: list, max_workers: int = None) -> tuple:
+    # Все ноги уже подписаны и сериализованы, на event loop только POST через keep-alive сессию прокси
+    semaphore = asyncio.Semaphore(max(1, max_workers or len(prepared_orders)))
+
+    async def submit(prepared_order):
+        async with semaphore:
+            response = await submit_order_async(prepared_order)
+            return response, time.perf_counter()
+
+    results = await asyncio.gather(*(submit(prepared_order) for prepared_order in prepared_orders))
+
+    responses = [response for response, _ in results]
+    fill_times = [filled_at for _, filled_at in results]
+    unhedged_window = max(fill_times) - min(fill_times) if fill_times else 0.0
+    return responses, unhedged_window
+
+
+def submit_orders_concurrently(prepared_orders: list, max_workers: int = None) -> tuple:
+    return run_sync(submit_orders_concurrently_async(prepared_orders, max_workers))
+
+
+async def open_order_async(wallet_data, instrument_ticker, amount, direction):
+    # Подпись в пуле потоков, на event loop только запрос
+    prepared_order = await asyncio.get_running_loop().run_in_executor(None, prepare_order, wallet_data, instrument_ticker, amount, direction)
+    return await submit_order_async(prepared_order)
+
+
+async def open_long_async(wallet_data, instrument_ticker, amount):
+    return await open_order_async(wallet_data, instrument_ticker, amount, "long")
+
+
+async def open_short_async(wallet_data, instrument_ticker, amount):
+    return await open_order_async(wallet_data, instrument_ticker, amount, "short")
+
+
+def open_order(wallet_data, instrument_ticker, amount, direction):
+    # Подпись остается в вызывающем потоке, на event loop уходит только запрос
+    return submit_order(prepare_order(wallet_data, instrument_ticker, amount, direction))
+
+
 def open_long(wallet_data, instrument_ticker, amount):
-    # return
     return open_order(wallet_data, instrument_ticker, amount, "long")
 
 
 def open_short(wallet_data, instrument_ticker, amount):
-    # return
     return open_order(wallet_data, instrument_ticker, amount, "short")